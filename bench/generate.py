@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+# end-to-end generate benchmark
+#
+# Generates a synthetic project (see genproject.py), then measures
+#
+# - each phase of generate, in-process through laze.generate.Project, as
+#   recorded by its profiler (see laze.profile)
+# - a cold "laze build" (generate + ninja)
+# - a no-op "laze build"
+#
+# and writes the results as JSON:
+#
+#     $ python3 bench/generate.py --modules 500 --runs 3 -o results.json
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import genproject
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from laze.generate import Project  # noqa: E402
+from laze.profile import Profiler  # noqa: E402
+
+# "laze generate" is re-run by ninja through sys.argv[0], so the CLI needs to
+# be available as an executable.
+WRAPPER = """#!/bin/sh
+PYTHONPATH=%s${PYTHONPATH:+:$PYTHONPATH} exec %s -c \
+"import sys; sys.argv[0] = '$0'; from laze.laze import cli; cli()" "$@"
+"""
+
+
+def run_phases(folder):
+    """ generate folder in-process.
+
+    Returns ({phase name: wall time}, top-level phase names, counts).
+    """
+
+    build_dir = os.path.join(folder, "build-phases")
+    shutil.rmtree(build_dir, ignore_errors=True)
+
+    profiler = Profiler()
+    project = Project(
+        {
+            "project_root": folder,
+            "project_file": os.path.join(folder, "laze-project.yml"),
+            "build_dir": build_dir,
+            "_global": True,
+        },
+        profiler=profiler,
+    )
+
+    cwd = os.getcwd()
+    try:
+        project.generate(write=True)
+    finally:
+        os.chdir(cwd)
+
+    # phases can run more than once, e.g., downloads for nested imports
+    timings = {}
+    top_level = []
+    for phase in profiler.phases:
+        name = phase["name"]
+        timings[name] = timings.get(name, 0.0) + phase["wall"]
+        if phase["depth"] == 0 and name not in top_level:
+            top_level.append(name)
+
+    counts = {
+        "buildfiles": len(project.files),
+        # project.modules includes the apps
+        "modules": len(project.modules) - len(project.apps),
+        "apps": len(project.apps),
+        "configured": project.app_count,
+        "build_statements": project.edge_num,
+    }
+
+    return timings, top_level, counts
+
+
+def laze_build(laze, folder):
+    before = time.perf_counter()
+    subprocess.check_call(
+        [laze, "build", "--global"],
+        cwd=folder,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - before
+
+
+def summarize(values):
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "max": max(values),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="laze end-to-end generate benchmark")
+    genproject.add_arguments(parser)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--noop-runs", type=int, default=5)
+    parser.add_argument("--output", "-o", help="write JSON results to this file")
+    parser.add_argument(
+        "--folder", help="generate project here (and keep it) instead of a tempdir"
+    )
+    parser.add_argument(
+        "--no-build", action="store_true", help='skip "laze build" measurements'
+    )
+    args = parser.parse_args()
+
+    params = genproject.params_from_args(args)
+
+    tmpdir = None
+    folder = args.folder
+    if folder is None:
+        tmpdir = folder = tempfile.mkdtemp(prefix="laze-bench-")
+    folder = os.path.abspath(folder)
+
+    try:
+        genproject.generate_project(folder, params)
+
+        phases = {}
+        for _ in range(args.runs):
+            # keep stdout for the results
+            with contextlib.redirect_stdout(sys.stderr):
+                timings, top_level, counts = run_phases(folder)
+            for phase, value in timings.items():
+                phases.setdefault(phase, []).append(value)
+            print(
+                "generate: "
+                + " ".join("%s %.3fs" % (phase, timings[phase]) for phase in top_level),
+                file=sys.stderr,
+            )
+
+        results = {
+            "params": params,
+            "python": platform.python_version(),
+            "counts": counts,
+            "phases": {phase: summarize(values) for phase, values in phases.items()},
+        }
+
+        if not args.no_build:
+            laze = os.path.join(folder, "laze-bench")
+            with open(laze, "w") as f:
+                f.write(WRAPPER % (REPO_ROOT, sys.executable))
+            os.chmod(laze, 0o755)
+
+            cold = []
+            for _ in range(args.runs):
+                shutil.rmtree(os.path.join(folder, "build"), ignore_errors=True)
+                cold.append(laze_build(laze, folder))
+            noop = [laze_build(laze, folder) for _ in range(args.noop_runs)]
+
+            results["build_cold"] = summarize(cold)
+            results["build_noop"] = summarize(noop)
+
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+# synthetic laze project generator
+#
+# Writes a laze project of configurable size and shape, for reproducible
+# benchmarking of "laze generate" and "laze build":
+#
+#     $ python3 bench/genproject.py --modules 1000 --fan-out 4 --apps 50 /tmp/p
+#
+# The project only uses regular laze syntax (rules, contexts, builders,
+# modules, apps, subdirs, templates and imports). Its rules just touch their
+# outputs, so it can be built without a toolchain.
+
+import argparse
+import json
+import os
+import random
+
+# per-module / per-app vars, roughly shaped like those of real projects
+CFLAGS = ["-Wall", "-Wextra", "-Os", "-g", "-ffunction-sections", "-fdata-sections"]
+
+RULES = [
+    {
+        "name": "CC",
+        "in": ".c",
+        "out": ".o",
+        "cmd": "true ${CC} ${CFLAGS} ${includes} -c ${in} && touch ${out}",
+    },
+    {
+        "name": "LINK",
+        "in": ".o",
+        "cmd": "true ${LINK} ${LINKFLAGS} ${in} && touch ${out}",
+    },
+    {"name": "SYMLINK", "cmd": "ln -f ${in} ${out}"},
+]
+
+DEFAULTS = {
+    "modules": 200,
+    "fan_out": 3,
+    "apps": 20,
+    "builders": 2,
+    "builder_depth": 3,
+    "template_matrix": "2x2",
+    "imports": 2,
+    "sources": 3,
+    "seed": 0,
+}
+
+
+def add_arguments(parser):
+    """ add generator parameters to an argparse parser. """
+
+    parser.add_argument("--modules", type=int, default=DEFAULTS["modules"])
+    parser.add_argument(
+        "--fan-out",
+        type=int,
+        default=DEFAULTS["fan_out"],
+        help="dependencies per module / app",
+    )
+    parser.add_argument("--apps", type=int, default=DEFAULTS["apps"])
+    parser.add_argument(
+        "--builders",
+        type=int,
+        default=DEFAULTS["builders"],
+        help="number of builder chains",
+    )
+    parser.add_argument(
+        "--builder-depth",
+        type=int,
+        default=DEFAULTS["builder_depth"],
+        help="length of each builder chain",
+    )
+    parser.add_argument(
+        "--template-matrix",
+        default=DEFAULTS["template_matrix"],
+        help='template dimensions of the templated app, e.g., "4x2"',
+    )
+    parser.add_argument(
+        "--imports",
+        type=int,
+        default=DEFAULTS["imports"],
+        help="number of imported module collections",
+    )
+    parser.add_argument(
+        "--sources", type=int, default=DEFAULTS["sources"], help="sources per module"
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+
+
+def params_from_args(args):
+    return {key: getattr(args, key) for key in DEFAULTS.keys()}
+
+
+def write_yaml(filename, data):
+    # JSON is valid YAML, and keeps this script free of dependencies
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "w") as f:
+        json.dump(data, f, indent=1)
+        f.write("\n")
+
+
+def touch(filename):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "w"):
+        pass
+
+
+def module_name(n):
+    return "m%05d" % n
+
+
+def import_module_name(i, n):
+    return "lib%d_m%03d" % (i, n)
+
+
+def builders(params):
+    res = []
+    for chain in range(params["builders"]):
+        parent = "default"
+        for level in range(params["builder_depth"]):
+            name = "b%d_%d" % (chain, level)
+            res.append(
+                {
+                    "name": name,
+                    "parent": parent,
+                    "vars": {"CFLAGS": ["-DBUILDER_%d_%d" % (chain, level)]},
+                }
+            )
+            parent = name
+    return res
+
+
+def template_matrix(spec):
+    template = {}
+    for dim, size in enumerate(spec.split("x") if spec else []):
+        template["@T%d@" % dim] = ["v%d" % n for n in range(int(size))]
+    return template
+
+
+def write_module(folder, name, depends, nsources, rand):
+    sources = []
+    for n in range(nsources):
+        source = "%s_%d.c" % (name, n)
+        touch(os.path.join(folder, source))
+        sources.append(source)
+
+    # an optional source, only used if the triggering module is present
+    if depends:
+        source = "%s_opt.c" % name
+        touch(os.path.join(folder, source))
+        sources.append({depends[0]: source})
+
+    module = {
+        "name": name,
+        "sources": sources,
+        "depends": depends,
+        "export_vars": {"includes": ["${relpath}/include"]},
+    }
+
+    if rand.random() < 0.3:
+        module["vars"] = {"CFLAGS": ["-DPRIVATE_%s" % name.upper()]}
+    if rand.random() < 0.1:
+        module["global_vars"] = {"CFLAGS": ["-DHAVE_%s" % name.upper()]}
+
+    write_yaml(os.path.join(folder, "laze.yml"), {"module": module})
+
+
+def pick(rand, names, count):
+    return sorted(rand.sample(names, min(count, len(names))))
+
+
+def generate_project(folder, params):
+    """ write a synthetic project to folder. """
+
+    rand = random.Random(params["seed"])
+    os.makedirs(folder, exist_ok=True)
+
+    project = {
+        "rule": RULES,
+        "context": [
+            {
+                "name": "default",
+                "vars": {"CFLAGS": CFLAGS, "CC": "cc", "LINK": "cc"},
+                "var_options": {"includes": {"prefix": "-I"}},
+            }
+        ],
+        "builder": builders(params),
+        "subdirs": ["modules", "apps", "variants"],
+    }
+
+    # imported module collections
+    imported = []
+    if params["imports"]:
+        project["import"] = []
+    for i in range(params["imports"]):
+        name = "lib%d" % i
+        lib_folder = os.path.join("imports", name)
+        project["import"].append({name: {"folder_override": lib_folder}})
+        names = [import_module_name(i, n) for n in range(10)]
+        modules = []
+        for n, name in enumerate(names):
+            source = "%s.c" % name
+            touch(os.path.join(folder, lib_folder, source))
+            modules.append(
+                {"name": name, "sources": [source], "depends": names[:n][-1:]}
+            )
+        write_yaml(os.path.join(folder, lib_folder, "laze.yml"), {"module": modules})
+        imported.extend(names)
+
+    write_yaml(os.path.join(folder, "laze-project.yml"), project)
+
+    # modules, each depending on some of the previously defined ones
+    names = []
+    for n in range(params["modules"]):
+        name = module_name(n)
+        depends = pick(rand, names + imported, params["fan_out"])
+        write_module(
+            os.path.join(folder, "modules", name), name, depends, params["sources"], rand
+        )
+        names.append(name)
+
+    write_yaml(os.path.join(folder, "modules", "laze.yml"), {"subdirs": names})
+
+    # apps
+    apps = []
+    for n in range(params["apps"]):
+        name = "app%04d" % n
+        app_folder = os.path.join(folder, "apps", name)
+        touch(os.path.join(app_folder, "main.c"))
+        app = {
+            "name": name,
+            "sources": ["main.c"],
+            "depends": pick(rand, names + imported, params["fan_out"]),
+        }
+        write_yaml(os.path.join(app_folder, "laze.yml"), {"app": app})
+        apps.append(name)
+
+    write_yaml(os.path.join(folder, "apps", "laze.yml"), {"subdirs": apps})
+
+    # an app instantiated once per template matrix entry
+    template = template_matrix(params["template_matrix"])
+    touch(os.path.join(folder, "variants", "main.c"))
+    suffix = "".join("_%s" % key for key in template.keys())
+    variants = {
+        "app": {
+            "name": "variant" + suffix,
+            "sources": ["main.c"],
+            "depends": pick(rand, names + imported, params["fan_out"]),
+            "vars": {"CFLAGS": ["-DVARIANT=%s" % suffix]},
+        }
+    }
+    if template:
+        variants["template"] = template
+    write_yaml(os.path.join(folder, "variants", "laze.yml"), variants)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="synthetic laze project generator")
+    add_arguments(parser)
+    parser.add_argument("folder")
+    args = parser.parse_args()
+
+    generate_project(args.folder, params_from_args(args))
+
+
+if __name__ == "__main__":
+    main()
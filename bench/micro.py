@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+# microbenchmarks for laze's hot helper functions
+#
+# Times laze.util and laze.deepcopy functions on input shaped like what
+# generate feeds them (long CFLAGS lists, nested vars, remove / prefix /
+# suffix entries), and stores per-call times as JSON:
+#
+#     $ python3 bench/micro.py run -o before.json
+#     $ python3 bench/micro.py run -o after.json
+#     $ python3 bench/micro.py compare before.json after.json --threshold 10
+#
+# "compare" exits with an error if any benchmark got slower by more than
+# the threshold (in percent).
+
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from laze.deepcopy import deepcopy  # noqa: E402
+from laze.util import (  # noqa: E402
+    deep_replace,
+    deep_safe_substitute,
+    deep_substitute,
+    dict_list_product,
+    finalize_vars,
+    flatten_var,
+    merge,
+    uniquify,
+)
+
+
+def cflags(n, prefix="-D"):
+    return ["%sFLAG_%d" % (prefix, i) for i in range(n)]
+
+
+def context_vars():
+    # vars of a builder context with some parents
+    return {
+        "CFLAGS": ["-Wall", "-Wextra", "-Os", "-g"] + cflags(40),
+        "LINKFLAGS": ["-Wl,--gc-sections", "-nostartfiles"] + cflags(10, "-l"),
+        "includes": ["${relpath}/include/%d" % i for i in range(30)],
+        "CC": ["arm-none-eabi-gcc"],
+        "LINK": ["arm-none-eabi-gcc"],
+        "relpath": ["boards/foo"],
+        "builder": ["foo"],
+        "app": ["hello"],
+    }
+
+
+def module_vars():
+    return {
+        "CFLAGS": cflags(10, "-DMODULE_") + cflags(5),
+        "includes": ["${relpath}/include", "${root}/sys/include"],
+        "export": {"nested": {"CFLAGS": cflags(5, "-DEXPORTED_")}},
+    }
+
+
+def modifier_var():
+    var = ["-Wall", "-Werror"] + cflags(60)
+    var.append({"remove": ["-Werror", "-DFLAG_3", "-DFLAG_7"]})
+    var.append({"prefix": ["-include", "config.h"]})
+    var.append({"suffix": ["-DLAST"]})
+    return var
+
+
+def template_data():
+    return {
+        "module": {
+            "name": "driver_$DRIVER",
+            "sources": ["$DRIVER/%d.c" % i for i in range(10)],
+            "vars": {"CFLAGS": ["-DDRIVER_$DRIVER", "-DVARIANT_$VARIANT"]},
+            "depends": ["periph_$DRIVER", "board_$VARIANT"],
+        }
+    }
+
+
+def nested_data():
+    # deepcopy input: a module's vars merged into a context
+    return {
+        "vars": context_vars(),
+        "module_vars": module_vars(),
+        "tools": {"flash": {"cmd": ["openocd -f ${board}.cfg"]}, "run": ["${out}"]},
+    }
+
+
+class Case(object):
+    """ a benchmark.
+
+    make() returns the argument tuple for one call. If the function modifies
+    its arguments, each call gets freshly made arguments (made outside of
+    the timed section).
+    """
+
+    def __init__(self, name, func, make, mutates=False):
+        self.name = name
+        self.func = func
+        self.make = make
+        self.mutates = mutates
+
+    def run(self, loops):
+        if self.mutates:
+            args_list = [self.make() for _ in range(loops)]
+        else:
+            args_list = [self.make()] * loops
+
+        func = self.func
+        before = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        return time.perf_counter() - before
+
+
+CASES = [
+    Case(
+        "merge_join_lists",
+        merge,
+        lambda: (context_vars(), module_vars(), None, False, False, False, True),
+        mutates=True,
+    ),
+    Case(
+        "merge_override",
+        lambda a, b: merge(a, b, override=True, change_listorder=False),
+        lambda: (context_vars(), context_vars()),
+        mutates=True,
+    ),
+    Case("uniquify_cflags", uniquify, lambda: (cflags(100) + cflags(100),)),
+    Case("flatten_var_plain", flatten_var, lambda: (cflags(60),)),
+    Case("flatten_var_modifiers", flatten_var, lambda: (modifier_var(),)),
+    Case(
+        "deep_substitute",
+        deep_substitute,
+        lambda: (module_vars(), {"relpath": "drivers/foo", "root": "."}),
+        mutates=True,
+    ),
+    Case(
+        "deep_safe_substitute",
+        deep_safe_substitute,
+        lambda: (context_vars(), {"relpath": "boards/foo"}),
+        mutates=True,
+    ),
+    Case("finalize_vars", finalize_vars, lambda: (context_vars(),), mutates=True),
+    Case(
+        "deep_replace",
+        deep_replace,
+        lambda: (template_data(), {"$DRIVER": "uart", "$VARIANT": "nrf52"}),
+    ),
+    Case(
+        "dict_list_product",
+        lambda d: list(dict_list_product(d)),
+        lambda: ({"A": cflags(8), "B": cflags(4), "C": cflags(3)},),
+    ),
+    Case("deepcopy", deepcopy, lambda: (nested_data(),)),
+    Case("copy.deepcopy (reference)", copy.deepcopy, lambda: (nested_data(),)),
+]
+
+
+def measure(case, min_time, repeat):
+    """ return the best per-call time of case in seconds. """
+
+    loops = 1
+    while True:
+        elapsed = case.run(loops)
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, case.run(loops))
+
+    return best / loops
+
+
+def run(args):
+    results = {}
+    for case in CASES:
+        if args.filter and args.filter not in case.name:
+            continue
+        per_call = measure(case, args.min_time, args.repeat)
+        results[case.name] = per_call
+        print("%-28s %10.2f us" % (case.name, per_call * 1e6), file=sys.stderr)
+
+    output = json.dumps(
+        {"python": platform.python_version(), "results": results},
+        indent=2,
+        sort_keys=True,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)["results"]
+    with open(args.new) as f:
+        new = json.load(f)["results"]
+
+    regressions = []
+    for name in sorted(set(old) & set(new)):
+        change = (new[name] - old[name]) * 100 / old[name]
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            "%-28s %10.2f us %10.2f us %+7.1f%%%s"
+            % (name, old[name] * 1e6, new[name] * 1e6, change, flag)
+        )
+
+    if regressions:
+        print(
+            "error: %s benchmark(s) slower by more than %.1f%%"
+            % (len(regressions), args.threshold)
+        )
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="laze helper microbenchmarks")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser("run", help="run benchmarks")
+    run_parser.add_argument("--output", "-o", help="write JSON results to this file")
+    run_parser.add_argument("--filter", "-k", help="only run matching benchmarks")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.1,
+        help="minimum duration of one measurement, in seconds",
+    )
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=float(os.environ.get("LAZE_BENCH_THRESHOLD", 10)),
+        help="allowed slowdown in percent",
+    )
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
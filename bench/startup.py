@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# laze CLI startup time benchmark
+#
+# Measures the time needed to get to the point where "laze build" starts
+# doing actual work (importing the CLI and the build subcommand), and checks
+# that heavy modules are not imported on that path.
+#
+# The time is measured inside the benchmarked process, after click has been
+# imported: click's own import time is outside of laze's control, and
+# comparing against separately started processes is too noisy.
+#
+# Exits with an error if the startup time exceeds the budget, so it can be
+# used in CI:
+#
+#     $ python3 bench/startup.py --budget-ms 40
+
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must not be imported by "laze build" unless re-generating
+FORBIDDEN_MODULES = [
+    "yaml",
+    "ninja_syntax",
+    "multiprocessing",
+    "laze.generate",
+    "laze.dl",
+    "laze.create",
+]
+
+STARTUP_CODE = """
+import time
+before = time.perf_counter()
+import click
+after_click = time.perf_counter()
+from laze.laze import cli
+cli.get_command(click.Context(cli), "build")
+print(after_click - before, time.perf_counter() - after_click)
+"""
+
+CHECK_CODE = """
+import click
+from laze.laze import cli
+cli.get_command(click.Context(cli), "build")
+import sys
+print(" ".join(m for m in %r if m in sys.modules))
+""" % (FORBIDDEN_MODULES,)
+
+
+def run(env):
+    """ returns (click import time, laze startup time). """
+
+    output = subprocess.check_output(
+        [sys.executable, "-c", STARTUP_CODE], env=env, universal_newlines=True
+    )
+    return [float(value) for value in output.split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="laze CLI startup benchmark")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.environ.get("LAZE_STARTUP_BUDGET_MS", 40)),
+        help="allowed startup time on top of importing click",
+    )
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [REPO_ROOT, env.get("PYTHONPATH")])
+    )
+
+    results = [run(env) for _ in range(args.runs)]
+    click_ms = min(result[0] for result in results) * 1000
+    overhead_ms = min(result[1] for result in results) * 1000
+
+    print("click import:        %7.1f ms" % click_ms)
+    print(
+        "laze build startup:  %7.1f ms (budget %.1f ms)"
+        % (overhead_ms, args.budget_ms)
+    )
+
+    failed = False
+
+    imported = subprocess.check_output(
+        [sys.executable, "-c", CHECK_CODE], env=env, universal_newlines=True
+    ).split()
+    if imported:
+        print("error: heavy modules imported at startup: %s" % ", ".join(imported))
+        failed = True
+
+    if overhead_ms > args.budget_ms:
+        print("error: startup time budget exceeded")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,13 @@
 import os
 import subprocess
 import sys
+import time
+
+from contextlib import contextmanager
 
 import click
 
-from laze.util import load_dict, split, compare_dict_without
+from laze.util import split, compare_dict_without, dict_hexdigest
 from laze.common import (
     determine_dirs,
     rel_start_dir,
@@ -14,7 +17,38 @@ from laze.common import (
     write_ninja_build_args_file,
 )
 
+from laze.index import Index
 import laze.mtimelog
+import laze.slots
+
+
+class NoProfiler(object):
+    """ stands in for laze.profile.Profiler if profiling is disabled. """
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+
+def print_profile(profiler, build_dir):
+    """ print profile summaries, returns the generate profile of this run. """
+
+    import laze.profile as laze_profile
+
+    data = None
+    phases = profiler.phases
+    since = min(phase["start"] for phase in phases) if phases else 0
+    profile_file = os.path.join(build_dir, laze_profile.PROFILE_FILE_NAME)
+    try:
+        if os.stat(profile_file).st_mtime >= since:
+            # generate ran (through ninja) during this build
+            data = laze_profile.load(build_dir)
+            print(laze_profile.format_summary(data, "laze: generate profile"))
+    except FileNotFoundError:
+        pass
+
+    print(laze_profile.format_summary(profiler.to_dict(), "laze: build profile"))
+    return data
 
 
 @click.command()
@@ -38,6 +72,16 @@ import laze.mtimelog
 @click.option("--jobs", "-j", type=click.INT, envvar="LAZE_JOBS")
 @click.option("--keep-going", "-k", type=click.INT, default=1, envvar="LAZE_JOBS")
 @click.option("--dump-data", "-d", is_flag=True, default=False, envvar="LAZE_DUMP_DATA")
+@click.option("--content-hash", is_flag=True, default=False, envvar="LAZE_CONTENT_HASH")
+@click.option("--object-store", is_flag=True, default=False, envvar="LAZE_OBJECT_STORE")
+@click.option(
+    "--generate-all", "-G", is_flag=True, default=False, envvar="LAZE_GENERATE_ALL"
+)
+@click.option("--profile", is_flag=True, default=False, envvar="LAZE_PROFILE")
+@click.option("--profile-cprofile", is_flag=True, default=False,
+              envvar="LAZE_PROFILE_CPROFILE")
+@click.option("--profile-memory", is_flag=True, default=False,
+              envvar="LAZE_PROFILE_MEMORY")
 @click.argument("targets", nargs=-1)
 def build(
     project_file,
@@ -53,7 +97,28 @@ def build(
     jobs,
     keep_going,
     dump_data,
+    content_hash,
+    object_store,
+    generate_all,
+    profile,
+    profile_cprofile,
+    profile_memory,
 ):
+    profile = profile or profile_memory
+    if profile:
+        import laze.profile as laze_profile
+        import laze.trace as laze_trace
+
+        profiler = laze_profile.Profiler(enabled=True)
+        # picked up by "laze generate" if ninja re-runs it
+        os.environ["LAZE_PROFILE"] = "1"
+        if profile_cprofile:
+            os.environ["LAZE_PROFILE_CPROFILE"] = "1"
+        if profile_memory:
+            os.environ["LAZE_PROFILE_MEMORY"] = "1"
+    else:
+        # laze.profile is not imported, as "laze build" should start quickly
+        profiler = NoProfiler()
 
     targets = split(targets)
     builders = split(builders)
@@ -66,12 +131,25 @@ def build(
         "_global": _global,
         "apps": targets,
         "dump_data": dump_data,
+        "content_hash": content_hash,
+        "object_store": object_store,
     }
 
+    if generate_all:
+        # configure all apps for all builders, independent of where laze was
+        # started. selection happens below, using the per-folder target map.
+        generate_args.update(
+            {"_global": True, "apps": [], "builders": [], "generate_all": True}
+        )
+
     start_dir, build_dir, project_root, project_file = determine_dirs(generate_args)
 
+    if generate_all:
+        generate_args["start_dir"] = project_root
+
     ninja_build_file = os.path.join(build_dir, "build.ninja")
     ninja_build_args_file = os.path.join(build_dir, "build-args.ninja")
+    state_file = os.path.join(build_dir, "laze-state.mp")
 
     os.chdir(project_root)
 
@@ -81,143 +159,164 @@ def build(
     builders = list(builders)
     builder_set = set(builders)
 
-    try:
-        if not laze.mtimelog.read_log(os.path.join(build_dir, "laze-files.mp"), True):
-            print("laze: buildfiles changed")
-            laze_args = None
-        else:
-            # here we figure out if there has already been a generate step that
-            # we can re-use.
-
-            laze_args = load_dict((build_dir, "laze-args"))
-
-            if laze_args == generate_args:
-                # args identical, continue
-                print("laze: re-using generated build files")
-                pass
-
-            elif compare_dict_without(laze_args, generate_args, ["apps", "builders"]):
-                laze_targets = set(laze_args["apps"])
-                laze_builders = set(laze_args["builders"])
-                if (((not laze_targets) or (target_set and target_set.issubset(laze_targets)))
-                    and
-                    ((not laze_builders) or (builder_set and builder_set.issubset(laze_builders)))
-                ):
-                    print("laze: targets configured, re-using lazed build files")
-                    print(laze_targets, not laze_targets, not laze_builders)
+    with profiler.phase("state"):
+        try:
+            if not laze.mtimelog.read_log(os.path.join(build_dir, "laze-files.mp"), True):
+                print("laze: buildfiles changed")
+                laze_args = None
+            else:
+                # here we figure out if there has already been a generate step that
+                # we can re-use.
+
+                with Index(state_file) as state:
+                    laze_args = state.data["args"]
+
+                if laze_args == generate_args:
+                    # args identical, continue
+                    print("laze: re-using generated build files")
+                    pass
+
+                elif compare_dict_without(laze_args, generate_args, ["apps", "builders"]):
+                    laze_targets = set(laze_args["apps"])
+                    laze_builders = set(laze_args["builders"])
+                    if (((not laze_targets) or (target_set and target_set.issubset(laze_targets)))
+                        and
+                        ((not laze_builders) or (builder_set and builder_set.issubset(laze_builders)))
+                    ):
+                        print("laze: targets configured, re-using lazed build files")
+                        print(laze_targets, not laze_targets, not laze_builders)
+                    else:
+                        laze_args = None
+
                 else:
                     laze_args = None
 
-            else:
-                laze_args = None
+        except (FileNotFoundError, ValueError):
+            print("laze: state not found or laze build file removed")
+            laze_args = None
 
-    except FileNotFoundError:
-        print("laze-args not found or laze build file removed")
-        laze_args = None
+        if laze_args is None:
+            if laze.slots.restore_slot(build_dir, dict_hexdigest(generate_args)):
+                print("laze: re-using build files generated earlier for these arguments")
+                laze_args = generate_args
 
     if laze_args is None:
-        print("laze: (re-)generating ninja build files")
-        laze_args_file = dump_args(build_dir, generate_args)
-
-        ninja_build_file = os.path.join(build_dir, "build.ninja")
-        ninja_build_args_file = os.path.join(build_dir, "build-args.ninja")
-        ninja_build_file_deps = ninja_build_file + ".d"
-        if not os.path.isfile(ninja_build_args_file):
-            write_ninja_build_args_file(
-                ninja_build_args_file,
-                ninja_build_file,
-                ninja_build_file_deps,
-                laze_args_file,
-                build_dir,
-            )
-
-        try:
-            subprocess.check_call(
-                ["ninja", "-f", ninja_build_args_file, "relaze"], cwd=project_root
-            )
-        except subprocess.CalledProcessError:
-            print("laze: re-generation of build files failed.")
-            sys.exit(1)
+        with profiler.phase("generate"):
+            print("laze: (re-)generating ninja build files")
+            laze_args_file = dump_args(build_dir, generate_args)
+
+            ninja_build_file = os.path.join(build_dir, "build.ninja")
+            ninja_build_args_file = os.path.join(build_dir, "build-args.ninja")
+            ninja_build_file_deps = ninja_build_file + ".d"
+            if not os.path.isfile(ninja_build_args_file):
+                write_ninja_build_args_file(
+                    ninja_build_args_file,
+                    ninja_build_file,
+                    ninja_build_file_deps,
+                    laze_args_file,
+                    build_dir,
+                )
 
-    if tool:
-        app_target_map = {}
-
-    #
-    # target filtering / selection
-    #
-    # unless "--global" is specified, all builder / app combinations
-    # will be filtered by what's defined in the folder from where
-    # laze was launched.
-    #
-    if _global:
-        ninja_targets = targets
-        print("laze: global mode")
-    else:
-        _rel_start_dir = rel_start_dir(start_dir, project_root)
+            try:
+                subprocess.check_call(
+                    ["ninja", "-f", ninja_build_args_file, "relaze"], cwd=project_root
+                )
+            except subprocess.CalledProcessError:
+                print("laze: re-generation of build files failed.")
+                sys.exit(1)
 
-        if _rel_start_dir == ".":
-            dir_text = "current folder"
+    # only needed for target selection, closed before ninja runs
+    with Index(state_file) as state:
+        if tool:
+            app_target_map = {}
+
+        #
+        # target filtering / selection
+        #
+        # unless "--global" is specified, all builder / app combinations
+        # will be filtered by what's defined in the folder from where
+        # laze was launched.
+        #
+        if _global and not (generate_all and builders):
+            ninja_targets = targets
+            print("laze: global mode")
         else:
-            dir_text = '"%s"' % _rel_start_dir
+            if _global:
+                print("laze: global mode")
+                dir_text = "project"
+                # apps in different folders can have the same name, so
+                # their targets are collected, not merged by app name
+                laze_local = []
+                for folder in state.keys("folders"):
+                    laze_local.extend(state.get("folders", folder).items())
+            else:
+                _rel_start_dir = rel_start_dir(start_dir, project_root)
 
-        print('laze: local mode in "%s"' % _rel_start_dir)
+                if _rel_start_dir == ".":
+                    dir_text = "current folder"
+                else:
+                    dir_text = '"%s"' % _rel_start_dir
 
-        try:
-            laze_local = load_dict((build_dir, "laze-app-per-folder"))[_rel_start_dir]
-        except KeyError:
-            if targets:
-                print(
-                    'laze: no targets defined in %s that match %s'
-                    % (dir_text, targets)
-                )
-            else:
-                print(
-                    'laze: no targets defined in %s.' % dir_text
-                )
-            sys.exit(1)
+                print('laze: local mode in "%s"' % _rel_start_dir)
+
+                folder_targets = state.get("folders", _rel_start_dir)
+                if folder_targets is not None:
+                    laze_local = list(folder_targets.items())
+                else:
+                    laze_local = None
 
-        ninja_targets = []
-        for app, builder_target in laze_local.items():
-            for builder, target in builder_target.items():
-                if builders:
-                    if builder not in builder_set:
-                        continue
+            if laze_local is None:
                 if targets:
-                    if app not in targets:
-                        continue
-                print("laze: building %s for %s" % (app, builder))
-                ninja_targets.append(target)
-                if tool:
-                    app_target_map[target] = (app, builder)
-
-        targets = ninja_targets
-
-    app_builder_tool_target_list = []
-    if tool:
-        if not ninja_targets:
-            print("laze: tool specified but no target given (or locally available).")
-            sys.exit(1)
+                    print(
+                        'laze: no targets defined in %s that match %s'
+                        % (dir_text, targets)
+                    )
+                else:
+                    print(
+                        'laze: no targets defined in %s.' % dir_text
+                    )
+                sys.exit(1)
 
-        if len(ninja_targets) > 1:
-            print("laze: multiple targets for tool %s specified.")
-            print("laze: if this is what you want, add --multi-tool / -m")
-            sys.exit(1)
+            ninja_targets = []
+            for app, builder_target in laze_local:
+                for builder, target in builder_target.items():
+                    if builders:
+                        if builder not in builder_set:
+                            continue
+                    if targets:
+                        if app not in targets:
+                            continue
+                    print("laze: building %s for %s" % (app, builder))
+                    ninja_targets.append(target)
+                    if tool:
+                        app_target_map[target] = (app, builder)
+
+            targets = ninja_targets
+
+        app_builder_tool_target_list = []
+        if tool:
+            if not ninja_targets:
+                print("laze: tool specified but no target given (or locally available).")
+                sys.exit(1)
 
-        tools = load_dict((build_dir, "laze-tools"))
+            if len(ninja_targets) > 1:
+                print("laze: multiple targets for tool %s specified.")
+                print("laze: if this is what you want, add --multi-tool / -m")
+                sys.exit(1)
 
-        for ninja_target in ninja_targets:
-            target_tools = tools.get(ninja_target, {})
-            app, builder = app_target_map[ninja_target]
+            for ninja_target in ninja_targets:
+                target_tools = state.get("tools", ninja_target, {})
+                app, builder = app_target_map[ninja_target]
 
-            tool_obj = target_tools.get(tool)
-            if not tool_obj:
-                print(
-                    "laze: target %s builder %s doesn't support tool %s"
-                    % (ninja_target, builder, tool)
-                )
-                sys.exit(1)
+                tool_obj = target_tools.get(tool)
+                if not tool_obj:
+                    print(
+                        "laze: target %s builder %s doesn't support tool %s"
+                        % (ninja_target, builder, tool)
+                    )
+                    sys.exit(1)
 
-            app_builder_tool_target_list.append((app, builder, ninja_target, tool_obj))
+                app_builder_tool_target_list.append((app, builder, ninja_target, tool_obj))
 
     if targets and not ninja_targets:
         print("no ninja targets, passing through")
@@ -231,21 +330,41 @@ def build(
     if keep_going is not None:
         ninja_extra_args += ["-k", str(keep_going)]
 
-    try:
-        subprocess.check_call(
-            ["ninja", "-f", ninja_build_file] + ninja_extra_args + ninja_targets,
-            cwd=project_root,
-        )
-    except subprocess.CalledProcessError:
-        sys.exit(1)
+    if profile:
+        ninja_log = os.path.join(build_dir, ".ninja_log")
+        ninja_log_position = laze_trace.ninja_log_position(ninja_log)
+        ninja_start = time.time()
 
-    for _, builder, _, tool in app_builder_tool_target_list:
-        for cmd in tool["cmd"]:
-            try:
-                subprocess.check_call(cmd, shell=True, cwd=project_root)
-            except subprocess.CalledProcessError:
-                print(
-                    'laze: error executing "%s" (tool=%s, target=%s, builder=%s)'
-                    % (cmd, tool, target, builder)
-                )
-                sys.exit(1)
+    with profiler.phase("ninja"):
+        try:
+            subprocess.check_call(
+                ["ninja", "-f", ninja_build_file] + ninja_extra_args + ninja_targets,
+                cwd=project_root,
+            )
+        except subprocess.CalledProcessError:
+            sys.exit(1)
+
+    with profiler.phase("tools"):
+        for _, builder, _, tool in app_builder_tool_target_list:
+            for cmd in tool["cmd"]:
+                try:
+                    subprocess.check_call(cmd, shell=True, cwd=project_root)
+                except subprocess.CalledProcessError:
+                    print(
+                        'laze: error executing "%s" (tool=%s, target=%s, builder=%s)'
+                        % (cmd, tool, target, builder)
+                    )
+                    sys.exit(1)
+
+    if profile:
+        generate_profile = print_profile(profiler, build_dir)
+
+        events = laze_trace.profile_events(profiler.to_dict(), "laze build")
+        if generate_profile is not None:
+            events.extend(
+                laze_trace.profile_events(generate_profile, "laze generate")
+            )
+        events.extend(
+            laze_trace.ninja_log_events(ninja_log, ninja_log_position, ninja_start)
+        )
+        print("laze: trace written to %s" % laze_trace.write(build_dir, events))
@@ -4,7 +4,6 @@ import sys
 from laze.debug import dprint
 import laze.constants as const
 from laze.util import dump_dict
-from ninja_syntax import Writer
 
 
 class InvalidArgument(Exception):
@@ -34,7 +33,7 @@ def locate_project_root(start_dir=None):
                 os.chdir("..")
 
 
-def determine_builddir(path, start_dir, project_root):
+def determine_builddir(path, start_dir, project_root, create=True):
     if os.path.isabs(path):
         pass
     elif path.startswith("."):
@@ -42,12 +41,13 @@ def determine_builddir(path, start_dir, project_root):
     else:
         path = os.path.abspath(os.path.join(project_root, path))
 
-    os.makedirs(path, exist_ok=True)
+    if create:
+        os.makedirs(path, exist_ok=True)
 
     return path
 
 
-def determine_dirs(args):
+def determine_dirs(args, create=True):
     args_file = args.get("args_file")
     build_dir = args["build_dir"]
     project_root = args["project_root"]
@@ -79,7 +79,7 @@ def determine_dirs(args):
 
         project_file = os.path.relpath(project_file, project_root)
 
-        build_dir = determine_builddir(build_dir, start_dir, project_root)
+        build_dir = determine_builddir(build_dir, start_dir, project_root, create)
         dprint("verbose", 'laze: using build dir "%s"' % build_dir)
         build_dir = os.path.relpath(build_dir, project_root)
 
@@ -105,6 +105,8 @@ def rel_start_dir(start_dir, project_root):
 def write_ninja_build_args_file(
     ninja_build_args_file, ninja_build_file, ninja_build_file_deps, args_file, build_dir
 ):
+    from ninja_syntax import Writer
+
     writer = Writer(open(ninja_build_args_file, "w"))
     writer.variable("builddir", build_dir)
 
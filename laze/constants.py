@@ -1,2 +1,18 @@
 PROJECTFILE_NAME = "laze-project.yml"
 BUILDFILE_NAME = "laze.yml"
+SERVER_SOCKET_NAME = "laze-server.sock"
+GRAPH_FILE_NAME = "laze-graph.mp"
+STATS_FILE_NAME = "laze-stats.json"
+
+# generate outputs whose size is recorded in laze-stats.json
+STATS_OUTPUT_FILES = [
+    "build.ninja",
+    "build-args.ninja",
+    "laze-state.mp",
+    "laze-graph.mp",
+    "laze-configure-cache.mp",
+    "laze-files.mp",
+    "laze-tools.yml",
+    "laze-app-per-folder.yml",
+    "laze-data.jsonl",
+]
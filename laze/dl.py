@@ -6,9 +6,6 @@ from laze.common import InvalidArgument
 from shutil import rmtree, copytree
 
 
-queue = {}
-
-
 def state_filename(target):
     return os.path.join(target, ".laze-dl.yml")
 
@@ -54,57 +51,60 @@ def git_clone(source, target, commit=None):
     write_state(source, target)
 
 
-def add_to_queue(download_source, target):
-    existing = queue.get(target)
-    if existing and (download_source != existing):
-        raise InvalidArgument("laze: error: duplicate download target %s" % target)
-
-    queue[target] = download_source
-
-
-def start():
-    for target, source in queue.items():
-        error = False
-        if type(source) == str:
-            if source.startswith("https://github.com/"):
-                git_clone(source, target)
-            elif source.endswith(".git"):
-                git_clone(source, target)
-            else:
-                error = True
-
-        elif type(source) == dict:
-            if "git" in source:
-                git = source.get("git")
-                url = git.get("url")
-                if url is None:
-                    raise InvalidArgument(
-                        "laze: error: git download source %s is missing url"
-                    )
-                commit = git.get("commit")
-                git_clone(url, target, commit)
-            elif "local" in source:
-                local = source["local"]
-                path = local.get("path")
-                if path is None:
-                    raise InvalidArgument(
-                        "laze: error: local download source %s is missing path"
-                    )
-                try:
-                    rmtree(target)
-                except FileNotFoundError:
-                    pass
-
-                copytree(path, target)
-            else:
-                error = True
-
-        if error:
-            raise InvalidArgument("laze: error: don't know how to download %s" % source)
-
-    reset()
-
-
-def reset():
-    global queue
-    queue = {}
+class Downloader(object):
+    """ collects download requests and executes them on start(). """
+
+    def __init__(self):
+        self.queue = {}
+
+    def add_to_queue(self, download_source, target):
+        existing = self.queue.get(target)
+        if existing and (download_source != existing):
+            raise InvalidArgument("laze: error: duplicate download target %s" % target)
+
+        self.queue[target] = download_source
+
+    def start(self):
+        for target, source in self.queue.items():
+            error = False
+            if type(source) == str:
+                if source.startswith("https://github.com/"):
+                    git_clone(source, target)
+                elif source.endswith(".git"):
+                    git_clone(source, target)
+                else:
+                    error = True
+
+            elif type(source) == dict:
+                if "git" in source:
+                    git = source.get("git")
+                    url = git.get("url")
+                    if url is None:
+                        raise InvalidArgument(
+                            "laze: error: git download source %s is missing url"
+                        )
+                    commit = git.get("commit")
+                    git_clone(url, target, commit)
+                elif "local" in source:
+                    local = source["local"]
+                    path = local.get("path")
+                    if path is None:
+                        raise InvalidArgument(
+                            "laze: error: local download source %s is missing path"
+                        )
+                    try:
+                        rmtree(target)
+                    except FileNotFoundError:
+                        pass
+
+                    copytree(path, target)
+                else:
+                    error = True
+
+            if error:
+                raise InvalidArgument("laze: error: don't know how to download %s" % source)
+
+        self.reset()
+
+    def reset(self):
+        self.queue = {}
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 
+import hashlib
+import json
 import os
 import re
 import sys
 import time
-from multiprocessing import Pool
 
 from .yaml import yaml, BaseLoader, Loader, Dumper
 
@@ -15,24 +16,28 @@ from itertools import chain
 from string import Template
 
 import click
+import msgpack
 
 from .util import (
+    boolify,
+    default_to_regular,
     deep_replace,
     deep_safe_substitute,
     deep_update,
+    dict_hexdigest,
     dict_list_product,
     dump_dict,
     finalize_vars,
     listify,
     merge,
     split,
-    static_vars,
     uniquify,
     yaml_fixup_empty_strings
 )
 
 from ninja_syntax import Writer
 import laze.dl as dl
+from laze.index import Index, write_index
 
 from laze.common import (
     ParseError,
@@ -44,14 +49,26 @@ from laze.common import (
 )
 
 import laze.mtimelog
+import laze.server
+import laze.slots
+import laze.trace
+from laze.profile import Profiler, format_summary
 
 from laze.debug import dprint
 import laze.constants as const
 
 
-files_set = set()
 short_module_defines = True
-global_build_dir = None
+
+# filename -> (stat key, parsed documents), only used by the laze server
+yaml_cache = None
+
+# (stat key, contents) of the configure cache file, only used by the laze
+# server
+configure_cache = None
+
+# project configured by worker processes (inherited by fork)
+_worker_project = None
 
 
 def get_data_folder():
@@ -65,16 +82,50 @@ def find_import_file(folder):
             return import_file
 
 
+def yaml_parse(filename, cache=None):
+    """ parse all yaml documents in filename.
+
+    If a cache is given, documents are only parsed again if the file
+    has changed since the last call. A deep copy is returned, as the caller
+    modifies the data in place.
+    """
+
+    if cache is None:
+        with open(filename, "r") as f:
+            return list(yaml.load_all(f.read(), Loader=BaseLoader))
+
+    stat = os.stat(filename)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = cache.get(filename)
+    if cached is None or cached[0] != key:
+        with open(filename, "r") as f:
+            cached = (key, list(yaml.load_all(f.read(), Loader=BaseLoader)))
+        cache[filename] = cached
+
+    return deepcopy(cached[1])
+
+
 def yaml_load(
-    filename, path=None, defaults=None, parent=None, imports=None, import_root=None
+    project,
+    filename,
+    path=None,
+    defaults=None,
+    parent=None,
+    imports=None,
+    import_root=None,
 ):
     def do_include(data):
         includes = listify(data.get("include"))
         _import_root = data.get("_import_root")
         for include in includes:
+            include = os.path.join(os.path.dirname(filename), include)
+            # included files can affect anything, so changing them always
+            # triggers a full reconfiguration
+            project.global_files.add(include)
             _data = (
                 yaml_load(
-                    os.path.join(os.path.dirname(filename), include),
+                    project,
+                    include,
                     path,
                     parent=filename,
                     imports=imports,
@@ -102,19 +153,21 @@ def yaml_load(
 
     # print("yaml_load(): loading %s with relpath %s" % (filename, path))
 
-    files_set.add(filename)
+    project.files.add(filename)
     if parent is None:
         imports = []
 
     try:
-        with open(filename, "r") as f:
-            datas = yaml.load_all(f.read(), Loader=BaseLoader)
+        datas = yaml_parse(filename, project.yaml_cache)
     except FileNotFoundError as e:
         msg = "laze: error: cannot find %s%s" % (
             filename,
             " (included by %s)" % parent if parent else "",
         )
         raise ParseError(msg) from e
+    except yaml.parser.ParserError as e:
+        print(filename, e)
+        sys.exit(1)
 
     res = []
     try:
@@ -126,9 +179,13 @@ def yaml_load(
             if import_root is not None:
                 data["_import_root"] = import_root
 
+            data["_buildfile"] = filename
+
             remember_imports()
 
             data_defaults = data.get("defaults", {})
+            if data_defaults:
+                project.global_files.add(filename)
 
             _defaults = defaults
             if _defaults:
@@ -183,9 +240,13 @@ def yaml_load(
                 data["_relpath"] = path
                 res.append(data)
                 for subdir in listify(data.get("subdirs", [])):
+                    project.subdirs.setdefault(
+                        os.path.dirname(filename) or ".", set()
+                    ).add(subdir)
                     relpath = os.path.join(path, subdir)
                     res.extend(
                         yaml_load(
+                            project,
                             os.path.join(relpath, const.BUILDFILE_NAME),
                             path=relpath,
                             defaults=_defaults,
@@ -236,18 +297,21 @@ def yaml_load(
                 else:
                     dl_source = {"git": {"url": url}}
 
-                global global_build_dir
-                folder = os.path.join(global_build_dir, "imports", name)
+                folder = os.path.join(project.build_dir, "imports", name)
                 if version is not None:
                     dl_source["git"]["commit"] = version
                     folder = os.path.join(folder, version)
                 else:
                     folder = os.path.join(folder, "latest")
 
-                if folder_override is None:
-                    dl.add_to_queue(dl_source, folder)
-                else:
+                if folder_override is not None:
                     folder = folder_override
+                elif project.writing:
+                    project.downloader.add_to_queue(dl_source, folder)
+                elif "local" in dl_source:
+                    # not copied, loaded from where it is
+                    folder = dl_source["local"]["path"]
+                # (otherwise, an earlier download is used, if there is one)
 
                 subdir = import_dict.get("subdir")
                 if subdir is not None:
@@ -255,7 +319,8 @@ def yaml_load(
 
                 imported_list.append((name, importer_filename, folder))
 
-            dl.start()
+            with project.profiler.phase("downloads"):
+                project.downloader.start()
 
             imports = []
             for imported in imported_list:
@@ -271,6 +336,7 @@ def yaml_load(
 
                 res.extend(
                     yaml_load(
+                        project,
                         import_file,
                         path=folder,
                         parent=importer_filename,
@@ -283,26 +349,50 @@ def yaml_load(
 
 
 class Declaration(object):
-    def __init__(self, **kwargs):
-        self.args = kwargs
-        self.relpath = self.args.get("_relpath")
-        self.root = self.args.get("_import_root") or "."
-
-        _vars = self.args.get("vars", {})
+    # declarations are created in large numbers (e.g., a Context per app and
+    # builder), so they use slots and only keep what has been parsed from
+    # their arguments. caches are allocated on first use.
+    __slots__ = ("project", "relpath", "root", "buildfile", "declared_vars")
+
+    def __init__(self, project, **kwargs):
+        self.project = project
+        self.relpath = kwargs.get("_relpath")
+        self.root = kwargs.get("_import_root") or "."
+        self.buildfile = kwargs.get("_buildfile")
+
+        _vars = kwargs.get("vars") or {}
         for key, value in _vars.items():
             _vars[key] = listify(value)
-        self.args["vars"] = _vars
+        self.declared_vars = _vars
 
-    def post_parse():
+    @staticmethod
+    def post_parse(project):
         pass
 
 
 class Context(Declaration):
     yaml_name = "context"
-    map = {}
+    __slots__ = (
+        "name",
+        "parent",
+        "children",
+        "modules",
+        "vars",
+        "tools",
+        "var_options",
+        "declared_tools",
+        "declared_var_options",
+        "bindir",
+        "disabled_modules",
+        "settings",
+    )
+
+    # build settings that can be declared on contexts (for all modules
+    # built in them) and on modules, see Module.get_setting()
+    setting_names = ("archive", "unity", "pch")
 
-    def __init__(self, add_to_map=True, **kwargs):
-        super().__init__(**kwargs)
+    def __init__(self, project, add_to_map=True, **kwargs):
+        super().__init__(project, **kwargs)
 
         self.name = kwargs.get("name")
         self.parent = kwargs.get("parent")
@@ -313,16 +403,24 @@ class Context(Declaration):
 
         self.var_options = None
 
-        self.bindir = self.args.get(
-            "bindir", os.path.join(self.args.get("_builddir"), "bin", self.name)
+        self.declared_tools = kwargs.get("tools") or {}
+        self.declared_var_options = kwargs.get("var_options")
+
+        self.bindir = kwargs.get(
+            "bindir", os.path.join(kwargs.get("_builddir"), "bin", self.name)
         )
 
         if add_to_map:
-            Context.map[self.name] = self
+            project.contexts[self.name] = self
 
         self.disabled_modules = set(kwargs.get("disable_modules", []))
+        self.settings = declared_settings(self, kwargs)
+        pch = self.settings.get("pch")
+        if pch is not None and not pch_disabled(pch):
+            # relative to this buildfile, like module sources
+            self.settings["pch"] = os.path.normpath(os.path.join(self.relpath, pch))
 
-        depends(self.name)
+        project.depends(self.name)
         # print("CONTEXT", s.name)
 
     def __repr__(self, nest=False):
@@ -334,12 +432,13 @@ class Context(Declaration):
             res += ")"
         return res
 
-    def post_parse():
-        for name, context in Context.map.items():
+    @staticmethod
+    def post_parse(project):
+        for name, context in project.contexts.items():
             if context.parent:
-                context.parent = Context.map[context.parent]
+                context.parent = project.contexts[context.parent]
                 context.parent.children.append(context)
-                depends(context.parent.name, name)
+                project.depends(context.parent.name, name)
 
     def vars_substitute(self, _vars):
         _dict = {
@@ -395,7 +494,7 @@ class Context(Declaration):
             pass
 
         else:
-            own_opts = self.args.get("var_options")
+            own_opts = self.declared_var_options
             if self.parent:
                 popts = deepcopy(self.parent.get_var_options())
                 if own_opts is not None:
@@ -458,12 +557,12 @@ class Context(Declaration):
             _vars = {}
             pvars = self.parent.get_vars()
             merge(_vars, deepcopy(pvars), override=True, change_listorder=False)
-            own_vars = self.vars_substitute(deepcopy(self.args.get("vars", {})))
+            own_vars = self.vars_substitute(deepcopy(self.declared_vars))
             merge(_vars, own_vars, override=True, change_listorder=False)
 
             self.vars = _vars
         else:
-            self.vars = self.vars_substitute(deepcopy(self.args.get("vars", {})))
+            self.vars = self.vars_substitute(deepcopy(self.declared_vars))
 
         return self.vars
 
@@ -472,12 +571,20 @@ class Context(Declaration):
             pass
         elif self.parent:
             self.tools = deepcopy(self.parent.get_tools())
-            self.tools.update(self.args.get("tools", {}))
+            self.tools.update(self.declared_tools)
         else:
-            self.tools = self.args.get("tools", {})
+            self.tools = self.declared_tools
 
         return self.tools
 
+    def get_setting(self, name):
+        """ return setting name as declared here or by the nearest parent. """
+
+        value = self.settings.get(name)
+        if value is None and self.parent:
+            return self.parent.get_setting(name)
+        return value
+
     def get_bindir(self):
         if "$" in self.bindir:
             _dict = defaultdict(lambda: "", name=self.name)
@@ -508,57 +615,60 @@ class Context(Declaration):
 
 class Builder(Context):
     yaml_name = "builder"
+    __slots__ = ()
 
     @staticmethod
-    def get():
-        for _, builder in Context.map.items():
+    def get(project):
+        for _, builder in project.contexts.items():
             if builder.__class__ == Builder:
                 yield builder
 
     @staticmethod
-    def get_names():
-        for builder in Builder.get():
+    def get_names(project):
+        for builder in Builder.get(project):
             yield builder.name
 
 
 class Rule(Declaration):
     yaml_name = "rule"
     rule_var_re = re.compile(r"\${\w+}")
-    rule_num = 0
-    rule_cached = 0
-    rule_map = {}
-    rule_name_map = {}
-    rule_cache = {}
-    file_map = {}
-
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.name = self.args["name"]
-        self.cmd = self.args["cmd"]
-        self.depfile = self.args.get("depfile")
-        self.deps = self.args.get("deps")
+    __slots__ = (
+        "name",
+        "cmd",
+        "depfile",
+        "deps",
+        "out_ext",
+        "pch",
+        "var_set",
+        "build_num",
+        "build_cached",
+    )
+
+    def __init__(self, project, **kwargs):
+        super().__init__(project, **kwargs)
+        self.name = kwargs["name"]
+        self.cmd = kwargs["cmd"]
+        self.depfile = kwargs.get("depfile")
+        self.deps = kwargs.get("deps")
+        self.out_ext = kwargs.get("out")
+        # rule precompiling headers for this rule's sources
+        self.pch = kwargs.get("pch")
+        self.build_num = 0
+        self.build_cached = 0
 
         try:
-            in_ext = self.args["in"]
-            if in_ext in Rule.rule_map:
+            in_ext = kwargs["in"]
+            if in_ext in project.rules_by_extension:
                 print("error: %s extension already taken")
                 return
-            Rule.rule_map[in_ext] = self
+            project.rules_by_extension[in_ext] = self
         except KeyError:
             pass
 
-        Rule.rule_name_map[self.name] = self
+        project.rules[self.name] = self
 
         self.create_var_list()
-        global writer
-        self.to_ninja(writer)
-
-    def get_by_extension(filename):
-        filename, file_extension = os.path.splitext(filename)
-        return Rule.rule_map[file_extension]
-
-    def get_by_name(name):
-        return Rule.rule_name_map[name]
+        self.to_ninja(project.writer)
 
     def create_var_list(self):
         _var_names = Rule.rule_var_re.findall(self.cmd)
@@ -579,40 +689,62 @@ class Rule(Declaration):
             depfile=self.depfile,
         )
 
-    def to_ninja_build(self, writer, _in, _out, _vars=None, deps=None):
+    def filter_vars(self, _vars):
+        # filter _vars by variable names from self.var_set
+        return {k: v for k, v in _vars.items() if k in self.var_set}
+
+    def cache_digest(self, _in, _vars, deps=None):
+        # stable across runs (unlike the rule cache key). depends only on
+        # what the rule cache key depends on (and on deps, if given), so
+        # identical build statements get the same digest, independent of
+        # app / builder selection.
+        key = [self.name, _in, self.filter_vars(_vars)]
+        if deps:
+            key.append(sorted(listify(deps)))
+        key = json.dumps(key, sort_keys=True)
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def object_path(self, object_dir, _in, _vars, deps=None):
+        # content-addressed output path (see --object-store)
+        return os.path.join(
+            object_dir, self.cache_digest(_in, _vars, deps) + self.out_ext
+        )
+
+    def to_ninja_build(self, writer, _in, _out, _vars=None, deps=None, cache=True):
         _vars = _vars or {}
         # print("RULE", self.name, _in, _out, _vars)
 
-        # filter _vars by variable names from self.var_set
-        vars = {k: v for k, v in _vars.items() if k in self.var_set}
+        vars = self.filter_vars(_vars)
+
+        if not cache:
+            # the output itself is what's needed, not an identical file
+            self.project.edge_num += 1
+            writer.build(outputs=_out, rule=self.name, inputs=_in, variables=vars, implicit=deps)
+            return _out
 
         # create a cache key from everything but the output
         cache_key = hash(
             "rule:%s in:%s vars:%s" % (self.name, _in, hash(frozenset(vars.items())))
         )
 
-        Rule.rule_num += 1
+        project = self.project
+        project.rule_num += 1
+        self.build_num += 1
         try:
-            cached = Rule.rule_cache[cache_key]
+            cached = project.rule_cache[cache_key]
             # print("laze: %s using cached %s for %s %s" % (s.name, cached, _in, _out))
-            Rule.rule_cached += 1
+            project.rule_cached += 1
+            self.build_cached += 1
             return cached
 
         except KeyError:
-            Rule.rule_cache[cache_key] = _out
+            project.rule_cache[cache_key] = _out
             # print("laze: NOCACHE: %s %s ->  %s" % (s.name, _in, _out), vars)
+            project.edge_num += 1
             writer.build(outputs=_out, rule=self.name, inputs=_in, variables=vars, implicit=deps)
             return _out
 
 
-@static_vars(map={})
-def depends(name, deps=None):
-    if type(deps) == set:
-        depends.map.setdefault(name, set()).update(deps)
-    else:
-        depends.map.setdefault(name, set()).update(listify(deps))
-
-
 def list_remove(_list):
     if _list:
         remove = set()
@@ -648,16 +780,43 @@ class Module(Declaration):
                 self.dependency,
             )
 
-    list = []
+    __slots__ = (
+        "name",
+        "context",
+        "context_name",
+        "sources",
+        "depends",
+        "used",
+        "depends_optional",
+        "depends_orthogonal",
+        "uses_all_modules",
+        "global_vars",
+        "declared_export_vars",
+        "download",
+        "prepare",
+        "depends_cache",
+        "uses_cache",
+        "used_deps_cache",
+        "export_vars",
+        "build_deps",
+        "override_source_location",
+        "custom_build",
+        "custom_build_rule",
+        "custom_build_out",
+        "custom_build_before_dependees",
+        "dldir",
+        "is_prepared",
+        "settings",
+    )
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        Module.list.append(self)
-        self.name = self.args.get("name")
+    def __init__(self, project, **kwargs):
+        super().__init__(project, **kwargs)
+        project.modules.append(self)
+        self.name = kwargs.get("name")
         if not self.name:
             if self.relpath:
                 self.name = os.path.dirname(self.relpath + "/")
-                import_root = self.args.get("_import_root")
+                import_root = kwargs.get("_import_root")
                 if import_root is not None:
                     self.name = os.path.relpath(self.name, import_root)
                     if self.name == ".":
@@ -666,13 +825,11 @@ class Module(Declaration):
         if not self.name:
             raise InvalidArgument("module missing name")
 
-        self.args["name"] = self.name
-
-        uses = self.args["uses"] = listify(self.args.get("uses"))
-        depends = self.args["depends"] = listify(self.args.get("depends"))
+        uses = listify(kwargs.get("uses"))
+        depends = listify(kwargs.get("depends"))
 
         # add optional sources' trigger modules to "uses"
-        sources = self.args.get("sources")
+        sources = self.sources = kwargs.get("sources")
         if sources:
             for source in sources:
                 if type(source) == dict:
@@ -707,48 +864,61 @@ class Module(Declaration):
             if name.startswith("?"):
                 uses.append(name[1:])
 
+        self.uses_all_modules = "all" in uses
+
         self.context = None
-        self.get_nested_cache = {}
-        self.export_vars = {}
+        self.context_name = kwargs.get("context", "default")
+        self.global_vars = kwargs.get("global_vars")
+        self.declared_export_vars = kwargs.get("export_vars")
+        self.download = kwargs.get("download")
+        self.prepare = kwargs.get("prepare")
 
         self.depends = depends
         self.used = uses
-        self.depends_cache = {}
-        self.uses_cache = {}
-        self.used_deps_cache = {}
+        self.depends_cache = None
+        self.uses_cache = None
+        self.used_deps_cache = None
+        self.export_vars = None
         self.build_deps = []
 
         self.override_source_location = None
+        # the custom build rule is created in post_parse(), so modules that
+        # get pruned don't add rules
+        self.custom_build = kwargs.get("build")
         self.custom_build_rule = None
-        self.handle_custom_build()
+        self.custom_build_out = None
+        self.custom_build_before_dependees = False
 
         self.dldir = None
         self.is_prepared = False
 
+        self.settings = declared_settings(self, kwargs)
+
     @staticmethod
-    def post_parse():
-        for module in Module.list:
-            context_name = module.args.get("context", "default")
-            context = Context.map.get(context_name)
+    def post_parse(project):
+        for module in project.modules:
+            context_name = module.context_name
+            context = project.contexts.get(context_name)
             if not context:
                 print(
                     "laze: error: module %s refers to unknown context %s"
                     % (module.name, context_name)
                 )
             module.context = context
-            context.modules[module.args.get("name")] = module
+            context.modules[module.name] = module
             # print("MODULE", module.name, "in", context)
-            last_prepare_dep = module.handle_download(module.args.get("download"))
+            module.handle_custom_build(module.custom_build)
+            last_prepare_dep = module.handle_download(module.download)
 
             last_prepare_dep = module.handle_prepare(last_prepare_dep)
             if last_prepare_dep is not None:
                 module.make_sources_depend(last_prepare_dep)
                 module.build_deps.append(last_prepare_dep)
 
-    def handle_custom_build(self):
-        custom_build = self.args.get("build")
+    def handle_custom_build(self, custom_build):
         if custom_build is not None:
             self.custom_build_rule = Rule(
+                self.project,
                 **{
                     "name": "BUILD_%s" % self.name,
                     "cmd": " && ".join(custom_build["cmd"]),
@@ -758,8 +928,7 @@ class Module(Declaration):
                 custom_build.get("build_before_dependees", False)
 
     def handle_prepare(self, last_prepare_dep):
-        global writer
-        prepare_list = self.args.get("prepare")
+        prepare_list = self.prepare
         if prepare_list is None:
             return last_prepare_dep
 
@@ -774,13 +943,14 @@ class Module(Declaration):
             out = prepare.get("out", ".prepared%s" % n)
             out = os.path.join(self.dldir, out)
             rule = Rule(
+                self.project,
                 **{
                     "name": "PREPARE_%s_%s" % (self.name, n),
                     "cmd": "(" + " && ".join(prepare["cmd"]) + ";)" +
                         " && touch ${out}",
                 })
             vars = {"srcdir": self.dldir}
-            rule.to_ninja_build(writer, None, out, vars, last_prepare_dep)
+            rule.to_ninja_build(self.project.writer, None, out, vars, last_prepare_dep)
             last_prepare_dep = out
 
         return last_prepare_dep
@@ -790,19 +960,18 @@ class Module(Declaration):
             return
 
         # make all source files depend on .download
-        for source in listify(self.args.get("sources", [])):
+        for source in listify(self.sources or []):
             if type(source) == dict:
                 for _optional in source.values():
                     for source in listify(_optional):
-                        depends(self.locate_source(source), dep)
+                        self.project.depends(self.locate_source(source), dep)
             else:
-                depends(self.locate_source(source), dep)
+                self.project.depends(self.locate_source(source), dep)
 
     def handle_download(self, download):
         if download:
-            global global_build_dir
             # TODO: check if relpath is appropriate
-            dldir = os.path.join(global_build_dir, "dl", self.relpath, self.name)
+            dldir = os.path.join(self.project.build_dir, "dl", self.relpath, self.name)
 
             if type(download) == dict:
                 subdir = download.get("subdir")
@@ -817,8 +986,8 @@ class Module(Declaration):
 
             dldir = os.path.join(dldir, commit)
 
-            dl_rule = Rule.get_by_name("GIT_DOWNLOAD")
-            res = dl_rule.to_ninja_build(writer, [], os.path.join(dldir, ".download"),
+            dl_rule = self.project.get_rule("GIT_DOWNLOAD")
+            res = dl_rule.to_ninja_build(self.project.writer, [], os.path.join(dldir, ".download"),
                                          {"URL": url, "COMMIT": commit})
 
             # make "locate_source()" return filenames in downloaded folder/[subdir/]
@@ -835,18 +1004,16 @@ class Module(Declaration):
 
             if patches:
                 patches[:] = [os.path.join(os.path.abspath(self.relpath), patch) for patch in patches]
-                patch_rule = Rule.get_by_name("PATCH")
+                patch_rule = self.project.get_rule("PATCH")
                 patched = os.path.join(dldir, ".patched")
-                res = patch_rule.to_ninja_build(writer, patches, patched, {"COMMIT": commit}, res)
+                res = patch_rule.to_ninja_build(self.project.writer, patches, patched, {"COMMIT": commit}, res)
 
             return res
 
     def get_deps(self, context, resolved=None, unresolved=None, optional=None):
         if resolved is None:
-            try:
+            if self.depends_cache is not None and context in self.depends_cache:
                 return self.depends_cache[context]
-            except KeyError:
-                pass
 
             # print("get_deps()", self.name)
 
@@ -913,30 +1080,30 @@ class Module(Declaration):
                 break
 
             _reversed = uniquify(reversed(resolved))
+            if self.depends_cache is None:
+                self.depends_cache = {}
             self.depends_cache[context] = _reversed
             # print("get_deps() resolved to", self.name, [ x.name for x in _reversed ])
             return _reversed
 
     def get_used(self, context, module_set):
-        try:
+        if self.uses_cache is not None and context in self.uses_cache:
             return self.uses_cache[context]
-        except KeyError:
-            pass
 
         res = []
         for dep_name in self.used:
             if dep_name in module_set:
                 res.append(context.get_module(dep_name))
 
+        if self.uses_cache is None:
+            self.uses_cache = {}
         self.uses_cache[context] = res
         return res
 
     def get_used_deps(self, context, module_set, resolved=None, unresolved=None):
         if resolved is None:
-            try:
+            if self.used_deps_cache is not None and context in self.used_deps_cache:
                 return self.used_deps_cache[context]
-            except KeyError:
-                pass
             resolved = []
             unresolved = set()
             recursed = False
@@ -958,11 +1125,52 @@ class Module(Declaration):
 
         if recursed is False:
             _reversed = uniquify(reversed(resolved))
+            if self.used_deps_cache is None:
+                self.used_deps_cache = {}
             self.used_deps_cache[context] = _reversed
             return _reversed
 
+    def referenced_names(self):
+        """ return names of all modules this module might pull in.
+
+        This includes optional and conditional dependencies, as their
+        availability influences dependency resolution.
+        """
+
+        names = {name.lstrip("?") for name in self.depends}
+        names.update(self.used)
+        names.update(self.depends_optional.keys())
+        names.update(self.depends_orthogonal.keys())
+        for _set in self.depends_orthogonal.values():
+            names.update(_set)
+        return names
+
+    def get_buildfiles(self, context):
+        """ return all buildfiles that can influence this module in context.
+
+        Follows all referenced module names (not only resolved ones), so
+        adding e.g. a dependency to a previously unavailable optional
+        module is caught.
+        """
+
+        buildfiles = set()
+        seen = set()
+        todo = [self]
+        while todo:
+            module = todo.pop()
+            buildfiles.add(module.buildfile)
+            for name in module.referenced_names():
+                if name in seen:
+                    continue
+                seen.add(name)
+                dep = context.get_module(name)
+                if dep is not None:
+                    todo.append(dep)
+
+        return buildfiles
+
     def get_vars(self, context):
-        vars = self.args.get("vars", {})
+        vars = self.declared_vars
         if vars:
             _vars = deepcopy(context.get_vars())
             merge(_vars, deepcopy(vars), override=True)
@@ -972,27 +1180,92 @@ class Module(Declaration):
             return deepcopy(context.get_vars())
 
     def get_export_vars(self, context, module_set):
-        try:
+        if self.export_vars is not None and context in self.export_vars:
             return self.export_vars[context]
-        except KeyError:
-            pass
 
         vars = {}
 
         for dep in self.get_used_deps(context, module_set):
             # print("get_export_vars", self.name, dep.name)
-            dep_export_vars = dep.args.get("export_vars", {})
+            dep_export_vars = dep.declared_export_vars
             if dep_export_vars:
                 dep_export_vars = deepcopy(dep_export_vars)
                 dep_export_vars = dep.vars_substitute(dep_export_vars, context)
                 merge(vars, dep_export_vars, join_lists=True)
 
+        if self.export_vars is None:
+            self.export_vars = {}
         self.export_vars[context] = vars
         return vars
 
     def get_bindir(self, context):
         return context.get_filepath(self.relpath)
 
+    def get_setting(self, context, name):
+        """ return setting name of this module, or the context's default. """
+
+        value = self.settings.get(name)
+        if value is None:
+            return context.get_setting(name)
+        return value
+
+    def get_pch(self, context):
+        """ return the header to precompile for this module, or None. """
+
+        pch = self.settings.get("pch")
+        if pch is None:
+            # context settings are already relative to the project root
+            return context.get_setting("pch")
+        if pch_disabled(pch):
+            return None
+        return self.locate_source(pch)
+
+    def get_unity_sources(self, sources, unity, build_dir):
+        """ combine sources into amalgamation ("unity") files.
+
+        Only pass sources that every app builds (not optional ones), so
+        that the amalgamations of a module don't depend on the app.
+
+        Returns the sources that still need to be built separately, and
+        a list of (amalgamation filename, content) tuples.
+        """
+
+        chunk_size, exclude = unity
+        separate = []
+        by_extension = {}
+        for source in sources:
+            if source in exclude:
+                separate.append(source)
+            else:
+                extension = os.path.splitext(source)[1]
+                by_extension.setdefault(extension, []).append(source)
+
+        unity_dir = os.path.normpath(os.path.join(build_dir, "unity", self.relpath))
+        unity_files = []
+        for extension, _sources in by_extension.items():
+            size = chunk_size or len(_sources)
+            for i in range(0, len(_sources), size):
+                chunk = _sources[i : i + size]
+                if len(chunk) == 1:
+                    separate.extend(chunk)
+                    continue
+
+                content = "".join(
+                    '#include "%s"\n'
+                    % os.path.relpath(self.locate_source(source), unity_dir)
+                    for source in chunk
+                )
+                # the same for all apps, so a file is shared by all of them
+                # and rewritten in place when the module's sources change
+                filename = os.path.join(
+                    unity_dir,
+                    "%s_%s%s"
+                    % (self.name.translate(transtab), i // size, extension),
+                )
+                unity_files.append((filename, content))
+
+        return separate, unity_files
+
     def vars_substitute(self, _vars, context):
         _dict = {
             "relpath": self.relpath,
@@ -1004,7 +1277,7 @@ class Module(Declaration):
         return deep_safe_substitute(_vars, _dict)
 
     def uses_all(self):
-        return "all" in listify(self.args.get("uses", []))
+        return self.uses_all_modules
 
     def get_defines(self, context, module_set):
         if self.uses_all():
@@ -1038,146 +1311,609 @@ class Module(Declaration):
 rec_dd = lambda: defaultdict(rec_dd)
 
 
-def per_builder(args):
-    builder, app_builderdict_list = args
+def declared_settings(declaration, kwargs):
+    """ return the build settings of a context or module declaration. """
+
+    settings = {
+        name: kwargs[name] for name in Context.setting_names if name in kwargs
+    }
+
+    pch = settings.get("pch")
+    if pch is not None and type(pch) != str:
+        raise ParseError(
+            'laze: error: %s %s: "pch" must be a header or "false", not a %s'
+            % (
+                type(declaration).__name__.lower(),
+                declaration.name,
+                "list" if type(pch) == list else "mapping",
+            )
+        )
+
+    return settings
+
+
+def pch_disabled(value):
+    # "pch: false" disables a precompiled header inherited from a context
+    return value.lower() in {"false", "no", "off", "none"}
+
+
+def unity_setting(value):
+    """ parse a "unity" setting.
+
+    Returns (chunk size, excluded sources) or None if unity builds are
+    disabled. A chunk size of 0 means one amalgamation for all sources.
+
+        unity: true
+        unity: 8
+        unity:
+          chunk: 8
+          exclude:
+            - special.c
+    """
+
+    if value is None:
+        return None
+
+    exclude = ()
+    if type(value) == dict:
+        exclude = frozenset(listify(value.get("exclude")))
+        value = value.get("chunk", "true")
+
+    if type(value) == str and value.isdigit():
+        chunk_size = int(value)
+        if chunk_size == 1:
+            return None
+    elif boolify(value):
+        chunk_size = 0
+    else:
+        return None
+
+    return chunk_size, exclude
+
+
+def per_builder(project, args):
+    builder_name, app_indices = args
+    builder = project.contexts[builder_name]
     result = []
-    for app, builder_dict in app_builderdict_list:
-        build_res_tuple = app.build(builder, builder_dict)
-        result.append(build_res_tuple)
+    with project.profiler.worker(builder_name):
+        for app_index in app_indices:
+            app = project.apps[app_index]
+            builderdict = {}
+            build_res_tuple = app.build(builder, builderdict)
+            result.append(
+                (app_builder_key(app.name, builder.name), builderdict, build_res_tuple)
+            )
 
     return result
 
 
+def _worker_init():
+    _worker_project.profiler.reset_worker()
+
+
+def _worker_per_builder(args):
+    result = per_builder(_worker_project, args)
+    return result, _worker_project.profiler.take_worker_data()
+
+
+def app_builder_key(app_name, builder_name):
+    return "%s:%s" % (app_name, builder_name)
+
+
+def configure_result(build_res_tuple):
+    # a pair's result without the builderdict, of which finalizing (a
+    # cached result) only needs the module names
+    if build_res_tuple is None:
+        return None
+
+    builderdict = build_res_tuple[0]
+    return ({"modules": list(builderdict.get("modules", ()))},) + tuple(
+        build_res_tuple[1:]
+    )
+
+
+# increase whenever the format of configure results changes
+CONFIGURE_CACHE_VERSION = 6
+
+
+def read_configure_cache(filename, preloaded=None):
+    """ read a configure cache file, returns (stat key, contents).
+
+    preloaded is the result of an earlier call. It is returned if the file
+    didn't change since then.
+    """
+
+    key = laze.mtimelog.stat_key(filename)
+    if preloaded is not None and preloaded[0] == key:
+        return preloaded
+
+    with open(filename, "rb") as f:
+        return key, msgpack.unpackb(f.read(), raw=False)
+
+
+def load_configure_cache(filename, args_digest, files_log, preloaded=None):
+    """ load configuration results of a previous generate run.
+
+    Returns the cache with all (app, builder) pairs removed that might be
+    affected by buildfiles that changed since then, or an empty cache if
+    a full reconfiguration is needed. preloaded is passed to
+    read_configure_cache() and not modified.
+    """
+
+    try:
+        _, cache = read_configure_cache(filename, preloaded)
+    except (FileNotFoundError, ValueError, msgpack.UnpackException):
+        return {}
+
+    if cache.get("version") != CONFIGURE_CACHE_VERSION:
+        return {}
+
+    if cache.get("args") != args_digest:
+        return {}
+
+    try:
+        changed = laze.mtimelog.read_log(files_log)
+    except FileNotFoundError:
+        # a buildfile (or the log) has been removed
+        return {}
+
+    impact = cache["impact"]
+    dirty = set()
+    for filename in changed:
+        if filename in cache["global"] or filename not in impact:
+            return {}
+        dirty.update(impact[filename])
+
+    buildfiles = defaultdict(list)
+    for filename, keys in impact.items():
+        for key in keys:
+            buildfiles[key].append(filename)
+
+    vars_table = cache["vars"]
+    pairs = {
+        key: None if packed is None else _unpack_result(
+            packed, vars_table, buildfiles[key]
+        )
+        for key, packed in cache["pairs"].items()
+        if key not in dirty
+    }
+
+    return dict(cache, pairs=pairs)
+
+
+# A pair's result is stored without its buildfiles (those are in the
+# impact map) and with the vars of each build statement filtered by its
+# rule. vars are shared by many build statements, so each is stored once.
+
+
+def _pack_result(build_res_tuple, pack_vars):
+    builderdict, objects, archives, precompiled, link_target, _depends, \
+        app_per_folder, _tools, generated, _ = build_res_tuple
+
+    def pack_objects(objects):
+        return [
+            (rule_name, out, _in, pack_vars(rule_name, vars), deps)
+            for rule_name, out, _in, vars, deps in objects
+        ]
+
+    link_name, outfile, link_vars = link_target
+    return [
+        builderdict,
+        pack_objects(objects),
+        [
+            (rule_name, archive, pack_objects(archive_objects),
+             pack_vars(rule_name, vars))
+            for rule_name, archive, archive_objects, vars in archives
+        ],
+        pack_objects(precompiled),
+        (link_name, outfile, pack_vars(link_name, link_vars)),
+        _depends,
+        app_per_folder,
+        _tools,
+        generated,
+    ]
+
+
+def _unpack_result(packed, vars_table, buildfiles):
+    builderdict, objects, archives, precompiled, link_target, _depends, \
+        app_per_folder, _tools, generated = packed
+
+    def unpack_objects(objects):
+        return [
+            (rule_name, out, _in, vars_table[vars], deps)
+            for rule_name, out, _in, vars, deps in objects
+        ]
+
+    link_name, outfile, link_vars = link_target
+    return (
+        builderdict,
+        unpack_objects(objects),
+        [
+            (rule_name, archive, unpack_objects(archive_objects),
+             vars_table[vars])
+            for rule_name, archive, archive_objects, vars in archives
+        ],
+        unpack_objects(precompiled),
+        (link_name, outfile, vars_table[link_vars]),
+        _depends,
+        app_per_folder,
+        _tools,
+        generated,
+        buildfiles,
+    )
+
+
+def write_configure_cache(
+    filename, args_digest, results, modules, files, global_files, rules
+):
+    impact = defaultdict(list)
+    for key, build_res_tuple in results.items():
+        for buildfile in build_res_tuple[-1] if build_res_tuple else []:
+            impact[buildfile].append(key)
+
+    for buildfile in files:
+        impact.setdefault(buildfile, [])
+
+    vars_table = []
+    vars_index = {}
+
+    def pack_vars(rule_name, vars):
+        vars = rules[rule_name].filter_vars(vars)
+        key = tuple(sorted(vars.items()))
+        try:
+            return vars_index[key]
+        except KeyError:
+            vars_table.append(vars)
+            index = vars_index[key] = len(vars_table) - 1
+            return index
+
+    pairs = {
+        key: None if build_res_tuple is None else _pack_result(build_res_tuple, pack_vars)
+        for key, build_res_tuple in results.items()
+    }
+
+    cache = {
+        "version": CONFIGURE_CACHE_VERSION,
+        "args": args_digest,
+        "global": sorted(global_files),
+        "modules": modules,
+        "impact": dict(impact),
+        "vars": vars_table,
+        "pairs": pairs,
+    }
+
+    with open(filename, "wb") as f:
+        f.write(msgpack.packb(cache, use_bin_type=False))
+
+
 class App(Module):
     yaml_name = "app"
-    count = 0
-    list = []
-    global_applist = set()
-    global_whitelist = set()
-    global_blacklist = set()
-    global_tools = rec_dd()  # defaultdict(lambda: dict())
-    global_app_per_folder = defaultdict(
-        lambda: defaultdict(lambda: defaultdict(lambda: dict()))
+    __slots__ = (
+        "bindir",
+        "whitelist",
+        "blacklist",
+        "tools",
+        "outfile",
+        "disable_modules",
     )
-    global_apps_data = dict()
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.__class__.list.append(self)
+    def __init__(self, project, **kwargs):
+        super().__init__(project, **kwargs)
+        project.apps.append(self)
 
-        self.bindir = self.args.get("bindir", os.path.join("${parent}", "${name}"))
+        self.bindir = kwargs.get("bindir", os.path.join("${parent}", "${name}"))
 
-        def _list(self, name):
-            return set(listify(self.args.get(name, [])))
+        def _list(name):
+            return set(listify(kwargs.get(name, [])))
 
-        self.whitelist = _list(self, "whitelist")
-        self.blacklist = _list(self, "blacklist") | App.global_blacklist
-        self.tools = self.args.get("tools", {})
+        self.whitelist = _list("whitelist")
+        self.blacklist = _list("blacklist") | project.blacklist
+        self.tools = kwargs.get("tools", {})
+        self.outfile = kwargs.get("outfile")
+        self.disable_modules = kwargs.get("disable_modules", [])
 
     def check_build(self):
-        if App.global_applist and self.name not in App.global_applist:
+        project = self.project
+        if project.applist and self.name not in project.applist:
             return
 
-        appdict = App.global_apps_data[self.name] = {}
-        for builder in Builder.get():
-            builderdict = appdict[builder.name] = {}
+        for builder in Builder.get(project):
+            builderdict = {}
             if not (
                     builder.listed(self.whitelist, empty_val=True)
-                    and builder.listed(App.global_whitelist, empty_val=True)
+                    and builder.listed(project.whitelist, empty_val=True)
             ):
                 builderdict["notbuilt_reason"] = "not whitelisted"
+                project.dump_data(self.name, builder.name, builderdict)
                 continue
 
             if builder.listed(self.blacklist):
                 builderdict["notbuilt_reason"] = "blacklisted"
+                project.dump_data(self.name, builder.name, builderdict)
                 continue
 
             yield builder, builderdict
 
     @staticmethod
-    def get_app_builder():
-        for app in App.list:
+    def get_app_builder(project):
+        for app in project.apps:
             for builder, _ in app.check_build():
                 yield app, builder
 
 
     @staticmethod
-    def get_app_builder_names():
+    def get_app_builder_names(project):
         # WARNING: needs Context.post_parse() step
-        for app, builder in App.get_app_builder():
+        for app, builder in App.get_app_builder(project):
             yield app.name, builder.name
 
 
     @staticmethod
-    def post_parse():
-        global writer
-
-        def finalize_build(build_res_tuple):
-            builderdict, object_targets, link_target, _depends, app_per_folder, _tools \
-                = build_res_tuple
+    def post_parse(project):
+        writer = project.writer
 
-            link_objects = []
-            for rule, obj, source_in, vars, build_deps in object_targets:
+        def build_objects(object_targets):
+            res = []
+            for rule_name, obj, source_in, vars, build_deps in object_targets:
+                rule = project.get_rule(rule_name)
                 _obj = rule.to_ninja_build(writer, source_in, obj, vars, build_deps)
-                link_objects.append(_obj)
+                res.append(_obj)
+                if _obj not in project.graph_objects:
+                    project.graph_objects[_obj] = {
+                        "rule": rule_name,
+                        "source": source_in,
+                        "vars": rule.filter_vars(vars),
+                    }
+            return res
+
+        def finalize_build(key, build_res_tuple):
+            builderdict, object_targets, archive_targets, precompiled, \
+                link_target, _depends, app_per_folder, _tools, generated, _ = \
+                build_res_tuple
+
+            for filename, content in generated:
+                project.write_generated(filename, content)
+
+            # precompiled headers are only implicit dependencies of objects.
+            # their path is per module, so identical ones of different
+            # modules can't share one through the rule cache.
+            for rule_name, pch_file, header, vars, build_deps in precompiled:
+                if pch_file not in project.precompiled_headers:
+                    project.precompiled_headers.add(pch_file)
+                    rule = project.get_rule(rule_name)
+                    rule.to_ninja_build(
+                        writer, header, pch_file, vars, build_deps, cache=False
+                    )
+                    project.graph_objects[pch_file] = {
+                        "rule": rule_name,
+                        "source": header,
+                        "vars": rule.filter_vars(vars),
+                    }
+
+            link_objects = build_objects(object_targets)
+
+            # identical archives (same objects and vars) are shared by all
+            # apps using them
+            link_archives = []
+            for rule_name, archive, archive_objects, vars in archive_targets:
+                rule = project.get_rule(rule_name)
+                link_archives.append(
+                    rule.to_ninja_build(
+                        writer, build_objects(archive_objects), archive, vars
+                    )
+                )
 
-            link, outfile, link_vars = link_target
-            res = link.to_ninja_build(writer, link_objects, outfile, link_vars)
+            link_name, outfile, link_vars = link_target
+            link = project.get_rule(link_name)
+            if link_archives:
+                # linked as a whole, see the LINK_ARCHIVES rule
+                link_vars = dict(link_vars, archives=" ".join(link_archives))
+            res = link.to_ninja_build(
+                writer, link_objects, outfile, link_vars, link_archives or None
+            )
             if res != outfile:
                 # An identical binary has been built for another Application.
                 # As the binary can be considered a final target, create a file
                 # symbolic link.
-                symlink = Rule.get_by_name("SYMLINK")
-                symlink.to_ninja_build(writer, res, outfile)
+                symlink = project.get_rule("SYMLINK")
+                symlink.to_ninja_build(writer, res, outfile, cache=False)
                 builderdict["outfile_real"] = res
 
             for k, v in _depends.items():
-                depends(k, v)
+                project.depends(k, v)
 
-            merge(App.global_app_per_folder, app_per_folder)
-            merge(App.global_tools, _tools)
-            App.count += 1
+            merge(project.app_per_folder, app_per_folder)
+            merge(project.tools, _tools)
+            project.app_count += 1
 
+            modules = list(builderdict.get("modules", ()))
+            project.graph_apps[key] = {
+                "modules": modules,
+                "outfile": outfile,
+                "objects": link_objects + link_archives,
+            }
+            for module_name in modules:
+                project.graph_module_users[module_name].append(key)
+
+        # if any module has been added or removed, dependency resolution of
+        # every app might change, so the configure cache cannot be used.
+        project.module_names = modules = sorted(
+            "%s:%s" % (module.context.name, module.name)
+            for module in project.modules
+            if type(module) is Module
+        )
+        cached = project.configure_cache.get("pairs", {})
+        if project.configure_cache.get("modules") != modules:
+            cached = {}
+        elif len({app.name for app in project.apps}) != len(project.apps):
+            # apps in different folders share a name, so their pairs can't
+            # be told apart
+            cached = {}
+
+        # the pairs of each builder, in a stable order
+        pairs = defaultdict(list)
+        npairs = 0
         nbuilds = 0
         builder_app_map = defaultdict(lambda: [])
-        for app in App.list:
-            for builder, builderdict in app.check_build():
+        for app_index, app in enumerate(project.apps):
+            for builder, _ in app.check_build():
+                key = app_builder_key(app.name, builder.name)
+                pairs[builder.name].append((key, app.name))
+                npairs += 1
+                if key in cached:
+                    continue
+
                 nbuilds += 1
-                builder_app_map[builder].append((app, builderdict))
+                builder_app_map[builder.name].append(app_index)
 
-        # limit multi-threaded parsing
-        if nbuilds < 20 or len(builder_app_map.keys()) < 2:
+        if cached:
+            print(
+                "laze: re-using %s of %s configured applications"
+                % (npairs - nbuilds, npairs)
+            )
+
+        # limit multi-threaded parsing.
+        # workers inherit the project through fork(), so only builder names
+        # and app indices need to be sent to them.
+        import multiprocessing
+
+        work = [
+            (builder_name, builder_app_map[builder_name])
+            for builder_name in pairs
+            if builder_name in builder_app_map
+        ]
+
+        global _worker_project
+        pool = None
+        if (
+            nbuilds < 20
+            or len(builder_app_map.keys()) < 2
+            or "fork" not in multiprocessing.get_all_start_methods()
+        ):
             print("laze: single-threaded mode")
-            _map = map
+            results = ((per_builder(project, item), None) for item in work)
 
         else:
             print("laze: multi-threaded mode")
-            _map = Pool().map
+            _worker_project = project
+            pool = multiprocessing.get_context("fork").Pool(initializer=_worker_init)
+            results = pool.imap(_worker_per_builder, work)
 
-        for res_list in _map(per_builder, builder_app_map.items()):
-            for build_res_tuple in res_list:
-                if build_res_tuple is None:
-                    continue
-                finalize_build(build_res_tuple)
+        # each builder's results are finalized (and dumped) as soon as they
+        # are available. the order is stable, so rule cache hits do not
+        # depend on which pairs were taken from the configure cache.
+        try:
+            with project.profiler.phase("configure"):
+                for builder_name, builder_pairs in pairs.items():
+                    configured = {}
+                    if builder_name in builder_app_map:
+                        res_list, worker_data = next(results)
+                        project.profiler.merge_worker_data(worker_data)
+                        for key, builderdict, build_res_tuple in res_list:
+                            configured.setdefault(key, []).append(
+                                (builderdict, build_res_tuple)
+                            )
+
+                    with project.profiler.accumulate("finalize"):
+                        for key, app_name in builder_pairs:
+                            try:
+                                builderdict, build_res_tuple = configured[key].pop(0)
+                            except (KeyError, IndexError):
+                                build_res_tuple = cached[key]
+                                builderdict = None
+
+                            if build_res_tuple is not None:
+                                finalize_build(key, build_res_tuple)
+                            if builderdict is not None:
+                                project.dump_data(app_name, builder_name, builderdict)
+
+                            # only keep what finalizing needs
+                            project.configure_results[key] = configure_result(
+                                build_res_tuple
+                            )
+        finally:
+            if pool is not None:
+                pool.terminate()
+                _worker_project = None
+
+    def precompile(self, module, rule, header, vars, build_dep_name, precompiled):
+        """ precompile header for module's sources built by rule.
+
+        Returns (precompiled header, vars, implicit deps) of those sources.
+        The precompiled header is None if rule doesn't support it.
+        """
+
+        project = self.project
+        if rule.pch is None:
+            warning = (module.name, rule.name)
+            if warning not in project.pch_warnings:
+                project.pch_warnings.add(warning)
+                print(
+                    "laze: warning: module %s: rule %s doesn't support "
+                    "precompiled headers, building its sources without %s"
+                    % (module.name, rule.name, header)
+                )
+            return None, vars, build_dep_name
+
+        try:
+            pch_rule = project.get_rule(rule.pch)
+        except KeyError:
+            print(
+                "laze: error: rule %s precompiles headers with unknown rule %s"
+                % (rule.name, rule.pch)
+            )
+            sys.exit(1)
+
+        if "CFLAGS" not in rule.var_set:
+            print(
+                "laze: error: rule %s precompiles headers, but doesn't use "
+                "${CFLAGS}" % rule.name
+            )
+            sys.exit(1)
+
+        # one per (module, rule, flags)
+        pch_file = os.path.join(
+            project.build_dir,
+            "pch",
+            os.path.normpath(
+                os.path.join(module.relpath, module.name.translate(transtab))
+            ),
+            pch_rule.cache_digest(header, vars),
+            os.path.basename(header) + ".gch",
+        )
+        precompiled.append((pch_rule.name, pch_file, header, vars, build_dep_name))
+
+        # gcc uses "<header>.gch" for "-include <header>"
+        pch_vars = dict(vars)
+        pch_vars["CFLAGS"] = " ".join(
+            ["-include", pch_file[: -len(".gch")], "-Winvalid-pch"]
+            + listify(vars.get("CFLAGS"))
+        )
+        pch_deps = [pch_file]
+        if build_dep_name:
+            pch_deps.append(build_dep_name)
+
+        return pch_file, pch_vars, pch_deps
 
     def build(self, builder, builderdict):
         _depends = {}
 
         def depends(name, deps=None):
-            _depends.setdefault(name, set()).update(listify(deps))
+            _depends.setdefault(name, []).extend(listify(deps))
 
         builder_name = builder.name
 
         #
         context = Context(
+            self.project,
             add_to_map=False,
             name=self.name,
             parent=builder,
             vars={"app": self.name, "builder": builder_name},
             tools=self.tools,
-            disable_modules=self.args.get("disable_modules", []),
+            disable_modules=self.disable_modules,
             _relpath=self.relpath,
-            _builddir=self.args.get("_builddir"),
+            _builddir=self.project.build_dir,
         )
 
         #
@@ -1198,8 +1934,11 @@ class App(Module):
 
         print("laze:  configuring", self.name, "for", builder_name)
 
+        profiler = self.project.profiler
+        object_dir = self.project.object_dir
         try:
-            modules = self.get_deps(context)
+            with profiler.accumulate("resolve"):
+                modules = self.get_deps(context)
         except Module.NotAvailable as e:
             print(
                 "laze: WARNING: skipping app",
@@ -1218,14 +1957,14 @@ class App(Module):
         build_deps = builderdict["build dependencies"] = []
         for module in modules:
             module_set.add(module.name)
-            module_global_vars = deepcopy(module.args.get("global_vars", {}))
+            module_global_vars = deepcopy(module.global_vars or {})
             module_global_vars = module.vars_substitute(module_global_vars, context)
             if module_global_vars:
                 merge(context_vars, module_global_vars, join_lists=True)
 
-            _sources = module.args.get("sources")
-            _deps = module.args.get("depends")
-            _uses = module.args.get("uses")
+            _sources = module.sources
+            _deps = module.depends
+            _uses = module.used
 
             module_dict = modules_dict[module.name] = {}
             module_dict["context"] = module.context.name
@@ -1251,10 +1990,14 @@ class App(Module):
 
         sources = []
         objects = []
+        archives = []
+        precompiled = []
+        generated = []
         for module in modules:
             module_dict = modules_dict[module.name]
-            _sources = listify(module.args.get("sources", []))
+            _sources = listify(module.sources or [])
             sources = []
+            optional_sources = []
 
             # handle optional sources ("- optional_module: file.c")
             for source in _sources:
@@ -1269,53 +2012,133 @@ class App(Module):
                             module_dict.setdefault(
                                 "optional sources used", []
                             ).extend(_optional_sources)
-                            sources.extend(_optional_sources)
+                            optional_sources.extend(_optional_sources)
                 else:
                     sources.append(source)
 
-            module_defines = module.get_defines(context, module_set)
+            with profiler.accumulate("vars"):
+                module_defines = module.get_defines(context, module_set)
 
-            module_vars = module.get_vars(context)
+                module_vars = module.get_vars(context)
 
-            module_vars["srcdir"] = module.locate_source()
-            module_vars["bindir"] = module.get_bindir(context)
+                module_vars["srcdir"] = module.locate_source()
+                module_vars["bindir"] = module.get_bindir(context)
 
-            module_export_vars = module.get_export_vars(context, module_set)
-            if module_export_vars:
-                module_export_vars = deepcopy(module_export_vars)
-                merge(module_vars, module_export_vars)
-                module_dict["export_vars"] = module_export_vars
+                module_export_vars = module.get_export_vars(context, module_set)
+                if module_export_vars:
+                    module_export_vars = deepcopy(module_export_vars)
+                    merge(module_vars, module_export_vars)
+                    module_dict["export_vars"] = module_export_vars
 
-            # add "-DMODULE_<module_name> for each used/depended module
-            if module_defines:
-                module_vars = deepcopy(module_vars)
-                cflags = module_vars.setdefault("CFLAGS", [])
-                cflags.extend(module_defines)
+                # add "-DMODULE_<module_name> for each used/depended module
+                if module_defines:
+                    module_vars = deepcopy(module_vars)
+                    cflags = module_vars.setdefault("CFLAGS", [])
+                    cflags.extend(module_defines)
 
-            if module_vars:
-                module_dict["vars"] = module_vars
+                if module_vars:
+                    module_dict["vars"] = module_vars
 
-            module_used = module.get_used(context, module_set)
-            if module_used:
-                module_dict["used"] = [x.name for x in module_used]
+                module_used = module.get_used(context, module_set)
+                if module_used:
+                    module_dict["used"] = [x.name for x in module_used]
 
-            module_vars = context.process_var_options(module_vars)
-            try:
-                module_vars_flattened = finalize_vars(module_vars)
-            except KeyError as e:
-                print("laze: error: in context %s (parent %s): unknown"
-                      "variable %s" %
-                      (context.name, context.parent.name, e.args[0]))
-                sys.exit(1)
+                module_vars = context.process_var_options(module_vars)
+                try:
+                    module_vars_flattened = finalize_vars(module_vars)
+                except KeyError as e:
+                    print("laze: error: in context %s (parent %s): unknown"
+                          "variable %s" %
+                          (context.name, context.parent.name, e.args[0]))
+                    sys.exit(1)
 
-            for source in sources:
-                source_in = module.locate_source(source)
-                rule = Rule.get_by_extension(source)
+            # build sources
+            unity_files = None
+            unity = unity_setting(module.get_setting(context, "unity"))
+            if unity is not None and len(sources) > 1:
+                # optional sources differ between apps, they're built
+                # separately
+                sources, unity_files = module.get_unity_sources(
+                    sources, unity, self.project.build_dir
+                )
+
+            sources.extend(optional_sources)
+            to_build = [(module.locate_source(source), source) for source in sources]
 
-                obj = context.get_filepath(
-                    os.path.join(module.relpath, source[:-2] + rule.args.get("out"))
+            if unity_files:
+                generated.extend(unity_files)
+                module_dict["unity"] = [filename for filename, _ in unity_files]
+                to_build.extend(
+                    (filename, os.path.basename(filename))
+                    for filename, _ in unity_files
+                )
+
+            # precompiled header, one per compile rule of the module's sources
+            pch = module.get_pch(context) if to_build else None
+            pch_by_rule = {}
+
+            # the objects of archived modules are linked as one static archive
+            module_objects = objects
+            if (
+                to_build
+                and module is not self
+                and boolify(module.get_setting(context, "archive"))
+            ):
+                module_objects = []
+
+            for source_in, source in to_build:
+                rule = self.project.get_rule_by_extension(source)
+
+                pch_file = None
+                obj_vars = module_vars_flattened
+                obj_deps = build_dep_name
+                if pch is not None:
+                    try:
+                        pch_file, obj_vars, obj_deps = pch_by_rule[rule.name]
+                    except KeyError:
+                        pch_file, obj_vars, obj_deps = pch_by_rule[
+                            rule.name
+                        ] = self.precompile(
+                            module, rule, pch, module_vars_flattened,
+                            build_dep_name, precompiled
+                        )
+                        if pch_file is not None:
+                            module_dict.setdefault("pch", []).append(pch_file)
+
+                if object_dir is not None:
+                    obj = rule.object_path(object_dir, source_in, obj_vars, pch_file)
+                else:
+                    obj = context.get_filepath(
+                        os.path.join(module.relpath, source[:-2] + rule.out_ext)
+                    )
+                module_objects.append((rule.name, obj, source_in, obj_vars, obj_deps))
+
+            if module_objects is not objects:
+                try:
+                    archive_rule = self.project.get_rule("ARCHIVE")
+                except KeyError:
+                    print(
+                        "laze: error: module %s is archived, but there's no "
+                        "ARCHIVE rule" % module.name
+                    )
+                    sys.exit(1)
+                if object_dir is not None:
+                    archive = archive_rule.object_path(
+                        object_dir,
+                        [obj for _, obj, _, _, _ in module_objects],
+                        module_vars_flattened,
+                    )
+                else:
+                    archive = context.get_filepath(
+                        os.path.join(
+                            module.relpath,
+                            "lib%s.a" % module.name.translate(transtab),
+                        )
+                    )
+                module_dict["archive"] = archive
+                archives.append(
+                    (archive_rule.name, archive, module_objects, module_vars_flattened)
                 )
-                objects.append((rule, obj, source_in, module_vars_flattened, build_dep_name))
 
             if module.custom_build_rule:
                 custom_out = context.get_filepath(
@@ -1328,19 +2151,25 @@ class App(Module):
                 else:
                     custom_deps = build_dep_name
 
-                objects.append((module.custom_build_rule, custom_out, None,
+                objects.append((module.custom_build_rule.name, custom_out, None,
                                 module_vars_flattened, custom_deps))
 
-        link_rule = Rule.get_by_name("LINK")
+        # archives need to be linked as a whole, which needs another rule
+        link_rule_name = "LINK_ARCHIVES" if archives else "LINK"
         try:
-            outfile = context.get_filepath(self.args["outfile"])
+            link_rule = self.project.get_rule(link_rule_name)
         except KeyError:
+            print("laze: error: app %s needs a %s rule" % (self.name, link_rule_name))
+            sys.exit(1)
+        if self.outfile is not None:
+            outfile = context.get_filepath(self.outfile)
+        else:
             outfile = context.get_filepath(os.path.basename(self.name)) + ".elf"
 
         # link target
         builderdict["outfile"] = outfile
         link_vars = finalize_vars(context.process_var_options(context_vars))
-        link_target = (link_rule, outfile, link_vars)
+        link_target = (link_rule.name, outfile, link_vars)
 
         # misc dependencies
         depends(context.parent.name, outfile)
@@ -1387,7 +2216,597 @@ class App(Module):
 
         app_per_folder = {self.relpath: {self.name: {builder.name: outfile}}}
 
-        return builderdict, objects, link_target, _depends, app_per_folder, _tools
+        buildfiles = sorted(self.get_buildfiles(context))
+
+        return (
+            builderdict,
+            objects,
+            archives,
+            precompiled,
+            link_target,
+            _depends,
+            app_per_folder,
+            _tools,
+            generated,
+            buildfiles,
+        )
+
+
+def is_up_to_date(build_dir, args, files_log):
+    """ check whether the outputs of a previous run with args are current. """
+
+    if not os.path.isfile(os.path.join(build_dir, "build.ninja")):
+        return False
+
+    try:
+        with Index(os.path.join(build_dir, "laze-state.mp")) as state:
+            if state.data["args"] != args:
+                return False
+
+        return laze.mtimelog.read_log(files_log, quickcheck=True)
+
+    except (FileNotFoundError, ValueError):
+        return False
+
+
+class Graph(object):
+    """ in-memory build graph.
+
+    Implements the parts of ninja_syntax.Writer that laze uses, so a project
+    can be generated without writing a ninja file.
+    """
+
+    def __init__(self):
+        self.variables = {}
+        self.rules = {}
+        self.builds = []
+
+    def variable(self, key, value, indent=0):
+        self.variables[key] = value
+
+    def rule(self, name, command, **kwargs):
+        rule = {"command": command}
+        rule.update({k: v for k, v in kwargs.items() if v is not None})
+        self.rules[name] = rule
+
+    def build(
+        self,
+        outputs,
+        rule,
+        inputs=None,
+        implicit=None,
+        order_only=None,
+        variables=None,
+        **kwargs
+    ):
+        self.builds.append(
+            {
+                "outputs": listify(outputs),
+                "rule": rule,
+                "inputs": listify(inputs),
+                "implicit": listify(implicit),
+                "order_only": listify(order_only),
+                "variables": variables or {},
+            }
+        )
+
+    def close(self):
+        pass
+
+
+class Project(object):
+    """ a laze project.
+
+    Holds all state of loading and configuring a project, so several
+    projects can be generated within one process, e.g.,
+
+        project = Project({"build_dir": "build", "_global": True})
+        graph = project.generate(write=False)
+
+    args has the same format as laze-args.yml. Paths are relative to the
+    project root, which generate() makes the current working directory.
+    """
+
+    # whether load / configure may touch the file system (see generate())
+    writing = True
+
+    classes = [Context, Builder, Rule, Module, App]
+    # declarations that potentially influence every app
+    global_classes = {Context, Builder, Rule}
+
+    def __init__(self, args, yaml_cache=None, profiler=None, configure_cache=None):
+        args = dict(args)
+        args.setdefault("build_dir", "build")
+        args.setdefault("project_root", None)
+        args.setdefault("project_file", None)
+        args["apps"] = split(args.get("apps") or [])
+        args["builders"] = split(args.get("builders") or [])
+
+        self.args = args
+        self.yaml_cache = yaml_cache
+        # see read_configure_cache()
+        self.preloaded_configure_cache = configure_cache
+        self.profiler = profiler or Profiler()
+
+        # the build dir is only created by generate()
+        dirs = determine_dirs(args, create=False)
+        self.start_dir, self.build_dir, self.project_root, self.project_file = dirs
+        self.rel_start_dir = rel_start_dir(self.start_dir, self.project_root)
+
+        self.whitelist = set(args["builders"])
+        self.blacklist = set()  # set(split(list(args.get("blacklist") or [])))
+        self.applist = set(args["apps"])
+
+        # buildfiles read (all / those that can influence every app)
+        self.files = set()
+        self.global_files = set()
+        # subdirs declared by the buildfiles of a folder
+        self.subdirs = {}
+
+        self.writer = None
+        self.downloader = dl.Downloader()
+
+        self.contexts = {}
+        self.rules = {}
+        self.rules_by_extension = {}
+        self.modules = []
+        self.apps = []
+        self.module_names = []
+
+        # ninja build statement de-duplication
+        self.rule_cache = {}
+        self.rule_num = 0
+        self.rule_cached = 0
+
+        # build statements written to build.ninja
+        self.edge_num = 0
+
+        # phony targets
+        self.depends_map = {}
+
+        self.app_count = 0
+        self.tools = rec_dd()
+        self.app_per_folder = defaultdict(
+            lambda: defaultdict(lambda: defaultdict(lambda: dict()))
+        )
+        # line-delimited JSON, one line per app / builder (--dump-data)
+        self.data_file = None
+
+        # queryable build graph, see laze.query
+        self.graph_apps = {}
+        self.graph_objects = {}
+        self.graph_module_users = defaultdict(list)
+
+        # sources written by generate (e.g., unity amalgamations)
+        self.generated_files = set()
+
+        # precompiled headers with a build statement
+        self.precompiled_headers = set()
+        self.pch_warnings = set()
+
+        # shared, content-addressed object files (--object-store)
+        self.object_dir = None
+        if args.get("object_store"):
+            self.object_dir = os.path.join(self.build_dir, "objects")
+
+        self.args_digest = dict_hexdigest(args)
+        self.configure_cache = {}
+        self.configure_results = {}
+
+    def path(self, filename):
+        return os.path.join(self.build_dir, filename)
+
+    def depends(self, name, deps=None):
+        if type(deps) == set:
+            self.depends_map.setdefault(name, set()).update(deps)
+        else:
+            self.depends_map.setdefault(name, set()).update(listify(deps))
+
+    def get_rule(self, name):
+        return self.rules[name]
+
+    def write_generated(self, filename, content):
+        """ write a generated source file, unless it is up-to-date. """
+
+        if filename in self.generated_files:
+            return
+        self.generated_files.add(filename)
+
+        if not self.writing:
+            return
+
+        try:
+            with open(filename) as f:
+                if f.read() == content:
+                    # keep the mtime, so ninja doesn't rebuild
+                    return
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        with open(filename, "w") as f:
+            f.write(content)
+
+    def get_rule_by_extension(self, filename):
+        filename, file_extension = os.path.splitext(filename)
+        return self.rules_by_extension[file_extension]
+
+    def load(self):
+        """ load all buildfiles, returns the list of yaml documents. """
+
+        os.chdir(self.project_root)
+        with self.profiler.phase("load"):
+            return yaml_load(self, self.project_file)
+
+    def parse(self, data_list, classes=None):
+        """ create declaration objects from loaded buildfiles. """
+
+        with self.profiler.phase("parse"):
+            self._parse(data_list, classes)
+
+    def _parse(self, data_list, classes):
+        _global = self.args.get("_global")
+        for data in data_list:
+            relpath = data.get("_relpath", "") or "."
+            import_root = data.get("_import_root", "")
+            buildfile = data.get("_buildfile")
+            for _class in classes or self.classes:
+                if (
+                    (not _global)
+                    and (_class.yaml_name == "app")
+                    and (relpath != self.rel_start_dir)
+                ):
+                    continue
+
+                datas = listify(data.get(_class.yaml_name, []))
+                if datas and _class in self.global_classes:
+                    self.global_files.add(buildfile)
+
+                for _data in datas:
+                    _data["_relpath"] = relpath
+                    _data["_builddir"] = self.build_dir
+                    _data["_import_root"] = import_root
+                    _data["_buildfile"] = buildfile
+                    _class(self, **_data)
+
+    def dump_data(self, app_name, builder_name, builderdict):
+        if self.data_file is not None:
+            entry = {"app": app_name, "builder": builder_name, "data": builderdict}
+            self.data_file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def configure(self):
+        """ run post parsing phase, writing build statements.
+
+        If args["dump_data"] is set, data of each app / builder is written to
+        laze-data.jsonl as soon as it has been configured.
+        """
+
+        if self.args.get("dump_data") and self.writing:
+            print("laze: dumping data")
+            self.data_file = open(self.path("laze-data.jsonl"), "w")
+
+        try:
+            with self.profiler.phase("configure"):
+                self._configure()
+        finally:
+            if self.data_file is not None:
+                self.data_file.close()
+                self.data_file = None
+
+    def prune(self):
+        """ drop declarations that cannot be part of the selected builds.
+
+        Keeps the selected builders, their descendants and ancestors, the
+        selected apps and all modules those might pull in (by name, including
+        optional and conditional dependencies), so unselected builders and
+        modules are neither post-processed nor configured.
+        """
+
+        contexts = self.contexts
+
+        def ancestors(name):
+            # parents are still names here, Context.post_parse resolves them
+            while name is not None:
+                yield name
+                context = contexts.get(name)
+                name = context.parent if context is not None else None
+
+        n_builders = 0
+        keep = set()
+        for name, context in contexts.items():
+            if context.__class__ != Builder:
+                continue
+            n_builders += 1
+            if not self.whitelist or self.whitelist & set(ancestors(name)):
+                keep.update(ancestors(name))
+
+        # other contexts are kept, unless they're (nested) children of a
+        # pruned builder
+        pruned = {
+            name
+            for name, context in contexts.items()
+            if context.__class__ == Builder and name not in keep
+        }
+        for name, context in contexts.items():
+            if context.__class__ != Builder and not pruned & set(ancestors(name)):
+                keep.add(name)
+
+        for name in list(contexts.keys()):
+            if name not in keep:
+                del contexts[name]
+                self.depends_map.pop(name, None)
+
+        if self.applist:
+            self.apps = [app for app in self.apps if app.name in self.applist]
+
+        # modules reachable from the selected apps
+        modules_by_name = defaultdict(list)
+        for module in self.modules:
+            if not isinstance(module, App):
+                modules_by_name[module.name].append(module)
+
+        reachable = set()
+        todo = list(self.apps)
+        while todo:
+            module = todo.pop()
+            for name in module.referenced_names():
+                if name not in reachable:
+                    reachable.add(name)
+                    todo.extend(modules_by_name.get(name, []))
+
+        def selected(module):
+            if isinstance(module, App):
+                return module in apps
+            return module.name in reachable
+
+        apps = set(self.apps)
+        n_modules = len(self.modules)
+        self.modules = [
+            module
+            for module in self.modules
+            if selected(module) and module.context_name in contexts
+        ]
+
+        print(
+            "laze: selected %s of %s builders, %s of %s modules and apps"
+            % (
+                len([c for c in contexts.values() if c.__class__ == Builder]),
+                n_builders,
+                len(self.modules),
+                n_modules,
+            )
+        )
+
+    def _configure(self):
+        profiler = self.profiler
+        if self.whitelist or self.applist:
+            with profiler.phase("prune"):
+                self.prune()
+
+        no_post_parse_classes = {Builder}
+        for _class in self.classes:
+            if _class in no_post_parse_classes:
+                continue
+            with profiler.phase("%s.post_parse" % _class.__name__):
+                _class.post_parse(self)
+
+        with profiler.phase("phony"):
+            for dep, _set in self.depends_map.items():
+                self.edge_num += 1
+                self.writer.build(rule="phony", outputs=dep, inputs=list(_set))
+
+    def generate(self, write=True):
+        """ load, parse and configure the project.
+
+        If write is set, build.ninja and all other generate outputs are
+        written to the build directory, external sources are downloaded and
+        the project root stays the current working directory.
+
+        Otherwise, the file system is left alone: local imports are loaded
+        from where they are, others from an earlier download. Generated
+        sources are not written, and the previous working directory is
+        restored. Returns the in-memory Graph of the build.
+        """
+
+        cwd = os.getcwd()
+        self.writing = write
+        try:
+            os.chdir(self.project_root)
+            if write:
+                os.makedirs(self.build_dir, exist_ok=True)
+
+            self.load_configure_cache()
+
+            data_list = self.load()
+
+            if write:
+                self.writer = Writer(open(self.path("build.ninja"), "w"))
+            else:
+                self.writer = Graph()
+
+            self.writer.variable("builddir", self.build_dir)
+
+            self.parse(data_list)
+            self.configure()
+            with self.profiler.phase("close"):
+                self.writer.close()
+
+            if write:
+                self.write()
+
+                # download external sources
+                with self.profiler.phase("downloads"):
+                    self.downloader.start()
+
+                self.write_stats()
+        finally:
+            if not write:
+                os.chdir(cwd)
+
+        return self.writer
+
+    def builder_names(self):
+        """ load the buildfiles, return the names of all builders. """
+
+        self.parse(self.load(), [Builder])
+        return Builder.get_names(self)
+
+    def load_configure_cache(self):
+        # configuration results of the previous run, for incremental
+        # regeneration. those don't have the data --dump-data needs.
+        if self.args.get("dump_data"):
+            self.configure_cache = {}
+            return
+
+        self.configure_cache = load_configure_cache(
+            self.path("laze-configure-cache.mp"),
+            self.args_digest,
+            self.path("laze-files.mp"),
+            self.preloaded_configure_cache,
+        )
+
+    def write(self):
+        """ write generate outputs (but build.ninja) to the build directory. """
+
+        with self.profiler.phase("write"):
+            self._write()
+
+    def _write(self):
+        build_dir = self.build_dir
+        ninja_build_file = self.path("build.ninja")
+        ninja_build_args_file = self.path("build-args.ninja")
+        ninja_build_file_deps = ninja_build_file + ".d"
+
+        args_file = dump_args(build_dir, self.args)
+
+        # create rule for automatically re-running laze if necessary
+        write_ninja_build_args_file(
+            ninja_build_args_file,
+            ninja_build_file,
+            ninja_build_file_deps,
+            args_file,
+            build_dir,
+        )
+
+        ## dump some data structures that build will pick up
+        dump_dict((build_dir, "laze-tools"), self.tools)
+        dump_dict((build_dir, "laze-app-per-folder"), self.app_per_folder)
+
+        # compact version of the above (plus args) for fast "laze build"
+        write_index(
+            self.path("laze-state.mp"),
+            {"args": self.args},
+            {
+                "folders": default_to_regular(self.app_per_folder),
+                "tools": default_to_regular(self.tools),
+            },
+        )
+
+        # indexed build graph for "laze query"
+        write_index(
+            self.path(const.GRAPH_FILE_NAME),
+            {"args": self.args},
+            {
+                "apps": self.graph_apps,
+                "objects": self.graph_objects,
+                "modules": dict(self.graph_module_users),
+            },
+        )
+
+        write_configure_cache(
+            self.path("laze-configure-cache.mp"),
+            self.args_digest,
+            self.configure_results,
+            self.module_names,
+            self.files,
+            self.global_files,
+            self.rules,
+        )
+        # also fingerprint all folders containing buildfiles, to notice new
+        # buildfiles or subdirs
+        dirs = {os.path.dirname(filename) or ".": () for filename in self.files}
+        dirs.update(self.subdirs)
+        laze.mtimelog.write_log(
+            self.path("laze-files.mp"),
+            self.files,
+            dirs,
+            hashed=self.args.get("content_hash", False),
+        )
+        with open(ninja_build_file_deps, "w") as f:
+            f.write(ninja_build_args_file + ": " + " ".join(self.files))
+
+    def write_stats(self):
+        """ write laze-stats.json, machine readable statistics of this run. """
+
+        n_apps = len(self.apps)
+        counts = {
+            "files": len(self.files),
+            "global_files": len(self.global_files),
+            "rules": len(self.rules),
+            "builders": len(list(Builder.get(self))),
+            "modules": len(self.modules) - n_apps,
+            "apps": n_apps,
+            "pairs": self.app_count,
+            "objects": len(self.graph_objects),
+            "edges": self.edge_num,
+            "phony": len(self.depends_map),
+            "build_statements": self.rule_num,
+            "build_statements_cached": self.rule_cached,
+        }
+
+        rules = {
+            name: {"builds": rule.build_num, "cached": rule.build_cached}
+            for name, rule in self.rules.items()
+        }
+
+        # (phases can run more than once, e.g., downloads for nested imports)
+        phases = {}
+        for phase in self.profiler.phases:
+            totals = phases.setdefault(phase["name"], {"wall": 0.0, "cpu": 0.0})
+            totals["wall"] += phase["wall"]
+            totals["cpu"] += phase["cpu"]
+
+        sizes = {}
+        for filename in const.STATS_OUTPUT_FILES:
+            try:
+                sizes[filename] = os.path.getsize(self.path(filename))
+            except FileNotFoundError:
+                pass
+
+        stats = {
+            "version": laze.__version__,
+            "time": time.time(),
+            "args_digest": self.args_digest,
+            "counts": counts,
+            "rules": rules,
+            "phases": phases,
+            "output_sizes": sizes,
+        }
+
+        with open(self.path(const.STATS_FILE_NAME), "w") as f:
+            json.dump(stats, f, indent=1, sort_keys=True)
+
+
+def server_argv(ctx, args_file):
+    """ return the arguments of this generate command for the server.
+
+    Options given on the command line or through the environment are
+    passed explicitly, so the server doesn't depend on its own environment.
+    """
+
+    argv = ["--args-file", args_file]
+    for param in ctx.command.params:
+        value = ctx.params.get(param.name)
+        if param.name == "args_file" or value in (None, param.default):
+            continue
+        if param.is_flag:
+            argv.append(param.opts[0] if value else param.secondary_opts[0])
+        elif param.multiple:
+            for item in value:
+                argv.extend([param.opts[0], item])
+        else:
+            argv.extend([param.opts[0], str(value)])
+
+    return argv
 
 
 @click.command()
@@ -1405,13 +2824,31 @@ class App(Module):
 @click.option("--dump-data", "-d", is_flag=True, default=False, envvar="LAZE_DUMP_DATA")
 @click.option("--list-builders", is_flag=True, default=False,
               envvar="LAZE_LIST_BUILDERS")
+@click.option("--content-hash", is_flag=True, default=False,
+              envvar="LAZE_CONTENT_HASH")
+@click.option("--variant-slots", type=click.INT, default=8,
+              envvar="LAZE_VARIANT_SLOTS")
+@click.option("--object-store", is_flag=True, default=False,
+              envvar="LAZE_OBJECT_STORE")
+@click.option("--profile", is_flag=True, default=False, envvar="LAZE_PROFILE")
+@click.option("--profile-cprofile", is_flag=True, default=False,
+              envvar="LAZE_PROFILE_CPROFILE")
+@click.option("--profile-memory", is_flag=True, default=False,
+              envvar="LAZE_PROFILE_MEMORY")
 def generate(**kwargs):
-    global writer
-    global global_build_dir
-    classes = [Context, Builder, Rule, Module, App, ]
+    profile_memory = kwargs.pop("profile_memory")
+    profile = kwargs.pop("profile") or profile_memory
+    profile_cprofile = kwargs.pop("profile_cprofile")
 
     args_file = kwargs.get("args_file")
     if args_file:
+        # let a running generate server handle this, if available
+        args_file = os.path.abspath(args_file)
+        argv = server_argv(click.get_current_context(), args_file)
+        status = laze.server.request(os.path.dirname(args_file), argv)
+        if status is not None:
+            sys.exit(status)
+
         # TODO: allow overriding via command line?
         args = yaml.load(open(args_file, "r"), Loader=Loader)
     else:
@@ -1419,123 +2856,75 @@ def generate(**kwargs):
         kwargs["builders"] = split(kwargs.get("builders"))
         args = kwargs
 
-    _global = args.get("_global")
-    apps = args.get("apps")
-    blacklist = args.get("blacklist")
-    builders = args.get("builders")
-
-    start_dir, build_dir, project_root, project_file = determine_dirs(args)
-    global_build_dir = build_dir
-    need_writer = True
-
-    os.chdir(project_root)
-
-    args_file = dump_args(build_dir, args)
+    profiler = Profiler(
+        enabled=profile,
+        cprofile=profile_cprofile,
+        memory=profile_memory,
+        count_types=(Context, Builder, Rule, Module, App),
+    )
+    project = Project(
+        args,
+        yaml_cache=yaml_cache,
+        profiler=profiler,
+        configure_cache=configure_cache,
+    )
+    args = project.args
+    build_dir = project.build_dir
+
+    os.chdir(project.project_root)
+
+    files_log = project.path("laze-files.mp")
+    if kwargs.get("args_file") and args.get("content_hash"):
+        if is_up_to_date(build_dir, args, files_log):
+            # ninja re-runs generate if any buildfile's mtime changed.
+            # as the relaze rule uses "restat", not touching build.ninja
+            # makes ninja consider it up-to-date again.
+            print("laze: buildfiles unchanged (by content), skipping generate")
+            return
 
-    App.global_whitelist = set(builders)
-    App.global_blacklist = set()  # set(split(list(blacklist or [])))
-    App.global_applist = set(apps)
+    if not args.get("_global"):
+        print("laze: generate: local mode in %s" % project.rel_start_dir)
 
-    if not _global:
-        _rel_start_dir = rel_start_dir(start_dir, project_root)
-        print("laze: generate: local mode in %s" % _rel_start_dir)
+    if kwargs.get("list_builders", False):
+        for builder in project.builder_names():
+            print(builder)
+        sys.exit(0)
 
-    before = time.time()
     try:
-        data_list = yaml_load(project_file)
+        project.generate(write=True)
     except ParseError as e:
-        sys.exit(0)
+        print(e)
+        sys.exit(1)
 
     print(
         "laze: loading %i buildfiles took %.2fs"
-        % (len(files_set), time.time() - before)
+        % (len(project.files), profiler.wall("load"))
     )
-
-    if kwargs.get("list_builders", False):
-        need_writer = False
-        classes = [Builder]
-
-    if need_writer:
-        ninja_build_file = os.path.join(build_dir, "build.ninja")
-        ninja_build_args_file = os.path.join(build_dir, "build-args.ninja")
-        ninja_build_file_deps = ninja_build_file + ".d"
-
-        writer = Writer(open(ninja_build_file, "w"))
-        writer.variable("builddir", build_dir)
-
-        # create rule for automatically re-running laze if necessary
-        write_ninja_build_args_file(
-            ninja_build_args_file,
-            ninja_build_file,
-            ninja_build_file_deps,
-            args_file,
-            build_dir,
-        )
-
-    before = time.time()
-    # PARSING PHASE
-    # create objects
-    for data in data_list:
-        relpath = data.get("_relpath", "") or "."
-        import_root = data.get("_import_root", "")
-        for _class in classes:
-            if (
-                (not _global)
-                and (_class.yaml_name == "app")
-                and (relpath != _rel_start_dir)
-            ):
-                continue
-
-            datas = listify(data.get(_class.yaml_name, []))
-            for _data in datas:
-                _data["_relpath"] = relpath
-                _data["_builddir"] = build_dir
-                _data["_import_root"] = import_root
-                _class(**_data)
-
-    #
-    if kwargs.get("list_builders", False):
-        for data in data_list:
-            datas = listify(data.get(Builder.yaml_name, []))
-            for _data in datas:
-                Builder(**_data)
-
-            for builder in Builder.get_names():
-                print(builder)
-            sys.exit(0)
-
-    no_post_parse_classes = {Builder}
-
-    before = time.time()
-    # POST_PARSING PHASE
-    for _class in classes:
-        if _class in no_post_parse_classes:
-            continue
-        _class.post_parse()
-
-    print("laze: processing buildfiles took %.2fs" % (time.time() - before))
-    print("laze: configured %s applications" % App.count)
-    if Rule.rule_num:
+    print(
+        "laze: processing buildfiles took %.2fs"
+        % (profiler.wall("parse") + profiler.wall("configure"))
+    )
+    print("laze: configured %s applications" % project.app_count)
+    if project.rule_num:
         print(
             "laze: cached: %s/%s (%.2f%%)"
-            % (Rule.rule_cached, Rule.rule_num, Rule.rule_cached * 100 / Rule.rule_num)
+            % (
+                project.rule_cached,
+                project.rule_num,
+                project.rule_cached * 100 / project.rule_num,
+            )
         )
 
-    for dep, _set in depends.map.items():
-        writer.build(rule="phony", outputs=dep, inputs=list(_set))
-
-    ## dump some data structures that build will pick up
-    dump_dict((build_dir, "laze-tools"), App.global_tools)
-    dump_dict((build_dir, "laze-app-per-folder"), App.global_app_per_folder)
-
-    ## optionally dump info struct
-    if args.get("dump_data"):
-        print("laze: dumping data")
-        dump_dict((build_dir, "laze-data"), App.global_apps_data)
-
-    laze.mtimelog.write_log(os.path.join(build_dir, "laze-files.mp"), files_set)
-    with open(ninja_build_file_deps, "w") as f:
-        f.write(ninja_build_args_file + ": " + " ".join(files_set))
+    # keep a copy of the outputs, for switching between app / builder selections
+    laze.slots.save_slot(
+        build_dir, project.args_digest, kwargs.get("variant_slots", 0)
+    )
 
-    # download external sources
-    dl.start()
+    if profile:
+        profiler.write(build_dir)
+        laze.trace.write(
+            build_dir, laze.trace.profile_events(profiler.to_dict(), "laze generate")
+        )
+        if not kwargs.get("args_file"):
+            # otherwise, "laze build" shows the summary
+            print(format_summary(profiler.to_dict()))
@@ -0,0 +1,81 @@
+# compact binary index files
+#
+# An index file consists of a small msgpack encoded header followed by
+# separately packed values. The header contains arbitrary data plus, for each
+# section, an offset table mapping keys to the location of their value.
+# Readers only unpack the header and the values they actually need.
+
+import struct
+
+import msgpack
+
+MAGIC = b"LAZEIDX1"
+_length = struct.Struct(">I")
+
+
+def write_index(filename, data, sections):
+    """ write index file.
+
+    data:     dictionary stored in the header
+    sections: dictionary of dictionaries, each value is packed separately
+    """
+
+    blobs = []
+    offset = 0
+    tables = {}
+    for section, values in sections.items():
+        table = tables[section] = {}
+        for key, value in values.items():
+            blob = msgpack.packb(value, use_bin_type=False)
+            table[key] = (offset, len(blob))
+            offset += len(blob)
+            blobs.append(blob)
+
+    header = msgpack.packb({"data": data, "sections": tables}, use_bin_type=False)
+
+    with open(filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(_length.pack(len(header)))
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+
+
+class Index(object):
+    def __init__(self, filename):
+        self.file = open(filename, "rb")
+        try:
+            magic = self.file.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError("%s: not a laze index file" % filename)
+
+            (length,) = _length.unpack(self.file.read(_length.size))
+            header = msgpack.unpackb(self.file.read(length), raw=False)
+        except BaseException:
+            self.file.close()
+            raise
+
+        self.data = header["data"]
+        self.sections = header["sections"]
+        self.base = len(MAGIC) + _length.size + length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def keys(self, section):
+        return self.sections[section].keys()
+
+    def get(self, section, key, default=None):
+        try:
+            offset, length = self.sections[section][key]
+        except KeyError:
+            return default
+
+        self.file.seek(self.base + offset)
+        return msgpack.unpackb(self.file.read(length), raw=False)
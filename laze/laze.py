@@ -1,22 +1,53 @@
 #!/usr/bin/env python3
 
+import importlib
 import os
 import click
 
 from click_default_group import DefaultGroup
 
-from .generate import generate
-from .build import build
-from .create import create
+# subcommands are only imported when invoked, as e.g., "laze generate" pulls
+# in the whole configuration engine, which "laze build" usually doesn't need.
+lazy_commands = {
+    "generate": ("laze.generate", "generate"),
+    "build": ("laze.build", "build"),
+    "create": ("laze.create", "create"),
+    "server": ("laze.server", "server"),
+    "watch": ("laze.watch", "watch"),
+    "query": ("laze.query", "query"),
+}
 
 
-@click.group(cls=DefaultGroup, default="build", default_if_no_args=True)
+class LazyGroup(DefaultGroup):
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def load_command(self, cmd_name):
+        if cmd_name in self.commands:
+            return
+        module, name = self.lazy_commands[cmd_name]
+        self.add_command(getattr(importlib.import_module(module), name), cmd_name)
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_commands:
+            self.load_command(cmd_name)
+        elif cmd_name not in self.commands:
+            # will resolve to the default command
+            self.load_command(self.default_cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(
+    cls=LazyGroup,
+    default="build",
+    default_if_no_args=True,
+    lazy_commands=lazy_commands,
+)
 @click.option("--chdir", "-C", type=click.STRING)
 def cli(chdir):
     if chdir:
         os.chdir(chdir)
-
-
-cli.add_command(generate)
-cli.add_command(build)
-cli.add_command(create)
@@ -1,51 +1,252 @@
 #!/usr/bin/env python3
 
+import hashlib
 import os
 import sys
 
 import msgpack
 
+import laze.constants as const
+
+# increase whenever the log format changes. logs with a different version
+# are considered outdated as a whole.
+LOG_VERSION = 4
+
+# number of files stat'ed per batch / threads used for stat'ing.
+# stat() releases the GIL, so on network filesystems, checking many files
+# in parallel hides most of the latency.
+BATCH_SIZE = 64
+MAX_WORKERS = 16
+
+# results of checking a log entry
+UNCHANGED = 0
+CHANGED = 1
+# stat info changed, but content did not. the entry has been updated.
+REFRESHED = 2
+
+
+def stat_key(filename):
+    stat = os.stat(filename)
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+
+def content_hash(filename):
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def dir_fingerprint(folder, names):
+    """ fingerprint the parts of a folder that matter to laze.
+
+    These are the buildfile names and the given names (the subdirs declared
+    by the folder's buildfiles), so adding e.g., a laze.yml is noticed, but
+    adding any other file or folder is not.
+    """
+
+    entries = []
+    for name in sorted(names):
+        path = os.path.join(folder, name)
+        if os.path.isdir(path):
+            entries.append(name + "/")
+        elif os.path.exists(path):
+            entries.append(name)
+
+    return hashlib.sha1("\0".join(entries).encode("utf-8")).hexdigest()
+
+
+def dir_key(folder, names):
+    names = sorted({const.BUILDFILE_NAME, const.PROJECTFILE_NAME} | set(names))
+    return [os.stat(folder).st_mtime_ns, names, dir_fingerprint(folder, names)]
+
+
+def dir_changed(folder, logged):
+    # folder mtime changes on any file creation or removal, so only use it
+    # to decide whether the fingerprinted names have to be looked at.
+    mtime = os.stat(folder).st_mtime_ns
+    if mtime == logged[0]:
+        return UNCHANGED
+
+    if dir_fingerprint(folder, logged[1]) != logged[2]:
+        return CHANGED
+
+    logged[0] = mtime
+    return REFRESHED
+
+
+def file_changed(filename, logged):
+    """ check a file log entry.
+
+    Entries are [mtime_ns, size, inode] and, if the log was written in
+    content hash mode, the file's content hash. Then a file whose stat info
+    changed (e.g., by "git checkout") only counts as changed if the content
+    did, too.
+    """
+
+    key = stat_key(filename)
+    if key == logged[:3]:
+        return UNCHANGED
+
+    if len(logged) < 4 or content_hash(filename) != logged[3]:
+        return CHANGED
+
+    logged[:3] = key
+    return REFRESHED
+
+
+def create_log(files, dirs=None, hashed=False):
+    """ create a log of files and folders.
+
+    dirs maps folders to the names (besides buildfile names) to fingerprint
+    in them.
+    """
 
-def create_log(files):
     log = {}
     for filename in files:
-        log[filename] = os.path.getmtime(filename)
+        log[filename] = stat_key(filename)
+        if hashed:
+            log[filename].append(content_hash(filename))
 
-    return log
+    dirs_log = {}
+    for folder, names in (dirs or {}).items():
+        dirs_log[folder] = dir_key(folder, names)
+
+    return {"version": LOG_VERSION, "files": log, "dirs": dirs_log}
+
+
+def _check_batch(batch, quickcheck=False, abort=None):
+    changed = []
+    refreshed = False
+    for changed_func, name, logged in batch:
+        if abort is not None and abort.is_set():
+            break
+        res = changed_func(name, logged)
+        if res == CHANGED:
+            changed.append(name)
+            if quickcheck:
+                if abort is not None:
+                    abort.set()
+                break
+        elif res == REFRESHED:
+            refreshed = True
+
+    return changed, refreshed
+
+
+def _outdated_files(log):
+    # best effort file list of logs written by older laze versions
+    files = log.get("files")
+    if not isinstance(files, dict):
+        files = log
+    return [name for name in files.keys() if name not in {"version", "dirs"}]
 
 
 def check_log(log, quickcheck=False):
-    if quickcheck is False:
+    """ check which of the logged files changed.
+
+    Returns the list of changed files and folders, or, if quickcheck is set,
+    False as soon as any change is found (True otherwise).
+    Raises FileNotFoundError if a logged file or folder has been removed.
+
+    Entries that turned out to be unchanged although their stat info changed
+    are updated in place and log["refreshed"] is set.
+    """
+
+    if log.get("version") != LOG_VERSION:
+        # report everything as changed (at least one entry)
+        return False if quickcheck else (_outdated_files(log) or [""])
+
+    items = [(file_changed, name, logged) for name, logged in log["files"].items()]
+    items.extend(
+        (dir_changed, name, logged) for name, logged in log["dirs"].items()
+    )
+    batches = [items[n : n + BATCH_SIZE] for n in range(0, len(items), BATCH_SIZE)]
+
+    if len(batches) < 2:
+        changed, refreshed = _check_batch(items, quickcheck)
+    else:
+        # only imported when needed, as they slow down "laze build" startup
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        abort = threading.Event() if quickcheck else None
         changed = []
-    for filename, logged_mtime in log.items():
-        current_mtime = os.path.getmtime(filename)
-        if current_mtime != logged_mtime:
-            if quickcheck:
-                return False
+        refreshed = False
+        workers = min(MAX_WORKERS, len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_check_batch, batch, quickcheck, abort)
+                for batch in batches
+            ]
+            for future in futures:
+                _changed, _refreshed = future.result()
+                changed.extend(_changed)
+                refreshed |= _refreshed
+                if changed and quickcheck:
+                    for pending in futures:
+                        pending.cancel()
+                    break
 
-            else:
-                changed.append(filename)
-    if not quickcheck:
-        return changed
+    if refreshed:
+        log["refreshed"] = True
+
+    if quickcheck:
+        return not changed
     else:
-        return True
+        return changed
 
 
-def read_log(logfile, quickcheck=False):
+def load_log(logfile):
     with open(logfile, "rb") as f:
-        return check_log(msgpack.unpackb(f.read(), raw=False), quickcheck)
+        log = msgpack.unpackb(f.read(), raw=False)
+
+    if not isinstance(log, dict):
+        raise ValueError("%s: invalid log file" % logfile)
 
+    return log
+
+
+def read_log(logfile, quickcheck=False):
+    log = load_log(logfile)
+    res = check_log(log, quickcheck)
+
+    # if nothing changed, store refreshed entries so the next check is cheap.
+    # otherwise, generate will write a new log anyway.
+    if log.pop("refreshed", False) and (res is True or res == []):
+        _write(logfile, log)
+
+    return res
+
+
+def log_files(logfile):
+    log = load_log(logfile)
+    if log.get("version") != LOG_VERSION:
+        return _outdated_files(log)
 
-def write_log(logfile, filenames):
+    return list(log["files"].keys())
+
+
+def log_dirs(logfile):
+    """ return {folder: fingerprinted names} of a log. """
+
+    log = load_log(logfile)
+    if log.get("version") != LOG_VERSION:
+        return {}
+
+    return {folder: logged[1] for folder, logged in log["dirs"].items()}
+
+
+def _write(logfile, log):
     with open(logfile, "wb") as f:
-        f.write(msgpack.packb(create_log(filenames), use_bin_type=False))
+        f.write(msgpack.packb(log, use_bin_type=False))
+
+
+def write_log(logfile, filenames, dirs=None, hashed=False):
+    _write(logfile, create_log(filenames, dirs, hashed))
 
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
-        log = create_log(sys.argv[1:])
-        write_log("mylog", log)
+        write_log("mylog", sys.argv[1:])
 
     else:
-        log = read_log("mylog")
-        print(check_log(log, quickcheck=True))
+        print(read_log("mylog", quickcheck=True))
@@ -0,0 +1,387 @@
+# phase profiler
+#
+# Records wall and CPU time of named phases, optionally with a cProfile
+# profile per phase. Phases can be nested. Configure workers record their
+# own spans, which are handed back to the parent process and merged.
+#
+# Results are written as JSON (laze-profile.json in the build dir), plus, if
+# cProfile is enabled, one pstats file containing all phases and workers.
+#
+# With memory profiling enabled, allocations are traced with tracemalloc, and
+# after each phase, traced memory, the RSS high-water mark, the top allocation
+# sites and the number of live objects of some types are recorded.
+
+import json
+import os
+import sys
+import time
+
+from contextlib import contextmanager
+
+PROFILE_FILE_NAME = "laze-profile.json"
+PSTATS_FILE_NAME = "laze-profile.pstats"
+
+# number of allocation sites recorded per phase
+MEMORY_TOP_SITES = 10
+
+
+class _Stats(object):
+    # wraps a raw stats dict so pstats.Stats.add() accepts it
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Profiler(object):
+    """ records phase timings (always, they are cheap) and, if enabled, all
+    other data. """
+
+    def __init__(self, enabled=False, cprofile=False, memory=False, count_types=()):
+        self.enabled = enabled
+        self.cprofile = enabled and cprofile
+        self.memory = enabled and memory
+        self.count_types = {_type.__name__ for _type in count_types}
+        self.pid = os.getpid()
+        self.phases = []
+        self.accumulated = {}
+        self.workers = []
+        self.stats = []
+        self.stack = []
+        self.active_profile = None
+
+        if self.memory:
+            import tracemalloc
+
+            tracemalloc.start()
+
+    def reset_worker(self):
+        """ forget state inherited from the parent, call in forked workers. """
+
+        if self.active_profile is not None:
+            self.active_profile.disable()
+            self.active_profile = None
+        self.phases = []
+        self.accumulated = {}
+        self.workers = []
+        self.stats = []
+        self.stack = []
+
+        if self.memory:
+            # tracing slows down workers a lot, only their RSS is recorded
+            import tracemalloc
+
+            tracemalloc.stop()
+
+    def _profile_start(self):
+        if not self.cprofile or self.stack:
+            # cProfile can only profile one thing at a time, so only
+            # top-level phases get their own profile
+            return None
+
+        import cProfile
+
+        profile = self.active_profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def _profile_stop(self, profile):
+        if profile is not None:
+            profile.disable()
+            self.active_profile = None
+            profile.create_stats()
+            self.stats.append(profile.stats)
+
+    @contextmanager
+    def phase(self, name):
+        """ record a phase. nested phases are named "outer/inner". """
+
+        profile = self._profile_start()
+        self.stack.append(name)
+        path = "/".join(self.stack)
+        start = time.time()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            entry = {
+                "name": path,
+                "depth": len(self.stack) - 1,
+                "start": start,
+                "wall": time.perf_counter() - wall,
+                "cpu": time.process_time() - cpu,
+            }
+            self.stack.pop()
+            self._profile_stop(profile)
+            if self.memory:
+                entry["memory"] = self._memory()
+            self.phases.append(entry)
+
+    def wall(self, name):
+        """ return the total wall time of all phases named name. """
+
+        return sum(phase["wall"] for phase in self.phases if phase["name"] == name)
+
+    @contextmanager
+    def accumulate(self, name):
+        """ add up the time of many short, repeated steps. """
+
+        if not self.enabled:
+            yield
+            return
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            totals = self.accumulated.setdefault(
+                name, {"wall": 0.0, "cpu": 0.0, "count": 0}
+            )
+            totals["wall"] += time.perf_counter() - wall
+            totals["cpu"] += time.process_time() - cpu
+            totals["count"] += 1
+
+    @contextmanager
+    def worker(self, name):
+        """ record the span of a unit of work handed to a worker. """
+
+        if not self.enabled:
+            yield
+            return
+
+        profile = None
+        if self.cprofile and os.getpid() != self.pid:
+            # forked worker (see reset_worker()). in the parent, the
+            # enclosing phase's profile covers the work.
+            import cProfile
+
+            profile = self.active_profile = cProfile.Profile()
+            profile.enable()
+
+        start = time.time()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            span = {
+                "name": name,
+                "pid": os.getpid(),
+                "start": start,
+                "wall": time.perf_counter() - wall,
+                "cpu": time.process_time() - cpu,
+            }
+            if self.memory:
+                span["rss_max"] = rss_max()
+            self.workers.append(span)
+            self._profile_stop(profile)
+
+    def _memory(self):
+        import gc
+        import tracemalloc
+
+        current, peak = tracemalloc.get_traced_memory()
+
+        # (Snapshot.filter_traces() is very slow on large snapshots, so
+        # filter the grouped statistics instead)
+        top = []
+        for stat in tracemalloc.take_snapshot().statistics("lineno"):
+            if len(top) == MEMORY_TOP_SITES:
+                break
+            frame = stat.traceback[0]
+            if frame.filename == tracemalloc.__file__:
+                continue
+            top.append(
+                {
+                    "file": frame.filename,
+                    "line": frame.lineno,
+                    "size": stat.size,
+                    "count": stat.count,
+                }
+            )
+
+        objects = {}
+        if self.count_types:
+            count_types = self.count_types
+            for obj in gc.get_objects():
+                name = type(obj).__name__
+                if name in count_types:
+                    objects[name] = objects.get(name, 0) + 1
+
+        reset_peak = getattr(tracemalloc, "reset_peak", None)
+        if reset_peak is not None:
+            # python >= 3.9, makes the peak per phase
+            reset_peak()
+
+        return {
+            "traced": current,
+            "traced_peak": peak,
+            "rss_max": rss_max(),
+            "objects": objects,
+            "top": top,
+        }
+
+    def take_worker_data(self):
+        """ return (and forget) data recorded by worker(). """
+
+        if not self.enabled:
+            return None
+
+        data = {
+            "workers": self.workers,
+            "accumulated": self.accumulated,
+            "stats": self.stats,
+        }
+        self.workers = []
+        self.accumulated = {}
+        self.stats = []
+        return data
+
+    def merge_worker_data(self, data):
+        if not data:
+            return
+
+        self.workers.extend(data["workers"])
+        for name, totals in data["accumulated"].items():
+            own = self.accumulated.setdefault(
+                name, {"wall": 0.0, "cpu": 0.0, "count": 0}
+            )
+            for key, value in totals.items():
+                own[key] += value
+        self.stats.extend(data["stats"])
+
+    def to_dict(self):
+        return {
+            "pid": self.pid,
+            "phases": self.phases,
+            "accumulated": self.accumulated,
+            "workers": self.workers,
+        }
+
+    def write(self, build_dir):
+        if not self.enabled:
+            return
+
+        if self.memory:
+            import tracemalloc
+
+            tracemalloc.stop()
+
+        with open(os.path.join(build_dir, PROFILE_FILE_NAME), "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+        if self.stats:
+            import pstats
+
+            stats = pstats.Stats(_Stats(self.stats[0]))
+            for _stats in self.stats[1:]:
+                stats.add(_Stats(_stats))
+            stats.dump_stats(os.path.join(build_dir, PSTATS_FILE_NAME))
+
+
+def rss_max():
+    """ return the RSS high-water mark of this process in bytes, or None. """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss
+    return rss * 1024
+
+
+def load(build_dir):
+    with open(os.path.join(build_dir, PROFILE_FILE_NAME)) as f:
+        return json.load(f)
+
+
+def format_summary(data, title="laze: profile"):
+    """ return a table of phases (and accumulated steps) in data. """
+
+    lines = [title, "  %-40s %9s %9s" % ("phase", "wall", "cpu")]
+    for phase in sorted(data.get("phases", []), key=lambda phase: phase["start"]):
+        name = "  " * phase.get("depth", 0) + phase["name"].rsplit("/", 1)[-1]
+        lines.append("  %-40s %8.3fs %8.3fs" % (name, phase["wall"], phase["cpu"]))
+
+    accumulated = data.get("accumulated", {})
+    if accumulated:
+        lines.append("  %-40s %9s %9s" % ("summed over apps (all workers)", "", ""))
+        for name, totals in sorted(accumulated.items()):
+            lines.append(
+                "  %-40s %8.3fs %8.3fs"
+                % ("  %s (%sx)" % (name, totals["count"]), totals["wall"], totals["cpu"])
+            )
+
+    workers = data.get("workers", [])
+    if workers:
+        pids = {worker["pid"] for worker in workers}
+        lines.append(
+            "  %-40s %8.3fs %8.3fs"
+            % (
+                "workers (%s processes, %s spans)" % (len(pids), len(workers)),
+                sum(worker["wall"] for worker in workers),
+                sum(worker["cpu"] for worker in workers),
+            )
+        )
+
+    lines.extend(format_memory(data))
+
+    return "\n".join(lines)
+
+
+def _mib(size):
+    if size is None:
+        return "-"
+    return "%.1fM" % (size / (1024 * 1024))
+
+
+def format_memory(data):
+    phases = [phase for phase in data.get("phases", []) if "memory" in phase]
+    if not phases:
+        return []
+
+    # phases are recorded when they end, so this is the state at the end
+    last = phases[-1]
+
+    phases.sort(key=lambda phase: phase["start"])
+    lines = ["  %-40s %9s %9s %9s" % ("memory after phase", "traced", "peak", "rss max")]
+    for phase in phases:
+        memory = phase["memory"]
+        name = "  " * phase.get("depth", 0) + phase["name"].rsplit("/", 1)[-1]
+        lines.append(
+            "  %-40s %9s %9s %9s"
+            % (
+                name,
+                _mib(memory["traced"]),
+                _mib(memory["traced_peak"]),
+                _mib(memory["rss_max"]),
+            )
+        )
+
+    memory = last["memory"]
+    if memory["objects"]:
+        lines.append(
+            "  live objects after %s: %s"
+            % (
+                last["name"],
+                ", ".join(
+                    "%s %s" % (name, count)
+                    for name, count in sorted(memory["objects"].items())
+                ),
+            )
+        )
+    if memory["top"]:
+        lines.append("  top allocation sites after %s:" % last["name"])
+        for site in memory["top"]:
+            lines.append(
+                "    %9s %8s blocks  %s:%s"
+                % (_mib(site["size"]), site["count"], site["file"], site["line"])
+            )
+
+    return lines
@@ -0,0 +1,130 @@
+# query the build graph
+#
+# "laze generate" stores the configured build graph in an index file
+# (see laze.index). Queries only unpack the entries they need, so answering
+# them doesn't require re-running generate or loading laze-data.jsonl.
+
+import os
+import sys
+
+import click
+
+from laze.common import determine_dirs
+from laze.index import Index
+import laze.constants as const
+
+
+def open_graph(ctx):
+    try:
+        return Index(ctx.obj["graph_file"])
+    except (FileNotFoundError, ValueError):
+        print(
+            "laze: error: no build graph found in %s, run laze generate first."
+            % os.path.dirname(ctx.obj["graph_file"])
+        )
+        sys.exit(1)
+
+
+def app_builder_keys(graph, app, builder=None):
+    if builder is not None:
+        return ["%s:%s" % (app, builder)]
+
+    prefix = app + ":"
+    return sorted(key for key in graph.keys("apps") if key.startswith(prefix))
+
+
+def object_key(graph, project_root, obj):
+    keys = graph.keys("objects")
+    if obj in keys:
+        return obj
+
+    # allow paths relative to the current folder. object paths in the graph
+    # are relative to the project root, but not necessarily normalized.
+    wanted = os.path.relpath(os.path.abspath(obj), project_root)
+    for key in keys:
+        if os.path.normpath(key) == wanted:
+            return key
+
+
+@click.group()
+@click.option("--project-file", "-f", type=click.STRING, envvar="LAZE_PROJECT_FILE")
+@click.option("--project-root", "-r", type=click.STRING, envvar="LAZE_PROJECT_ROOT")
+@click.option(
+    "--build-dir", "-B", type=click.STRING, default="build", envvar="LAZE_BUILDDIR"
+)
+@click.pass_context
+def query(ctx, project_file, project_root, build_dir):
+    """ query the build graph of the last generate run. """
+
+    args = {
+        "project_file": project_file,
+        "project_root": project_root,
+        "build_dir": build_dir,
+    }
+    _, build_dir, project_root, _ = determine_dirs(args)
+
+    ctx.obj = {
+        "project_root": project_root,
+        "graph_file": os.path.join(project_root, build_dir, const.GRAPH_FILE_NAME),
+    }
+
+
+@query.command()
+@click.argument("app")
+@click.argument("builder", required=False)
+@click.pass_context
+def modules(ctx, app, builder):
+    """ list modules used by APP (for BUILDER). """
+
+    with open_graph(ctx) as graph:
+        keys = app_builder_keys(graph, app, builder)
+        found = False
+        for key in keys:
+            entry = graph.get("apps", key)
+            if entry is None:
+                continue
+            found = True
+            if builder is None:
+                print("%s:" % key.split(":", 1)[1])
+            for module in entry["modules"]:
+                print(("    %s" if builder is None else "%s") % module)
+
+    if not found:
+        print("laze: error: app %s is not configured%s"
+              % (app, " for builder %s" % builder if builder else ""))
+        sys.exit(1)
+
+
+@query.command()
+@click.argument("module")
+@click.pass_context
+def users(ctx, module):
+    """ list app:builder pairs using MODULE. """
+
+    with open_graph(ctx) as graph:
+        for key in graph.get("modules", module, []):
+            print(key)
+
+
+@query.command("vars")
+@click.argument("obj")
+@click.argument("names", nargs=-1)
+@click.pass_context
+def _vars(ctx, obj, names):
+    """ show variables used to build object OBJ (optionally only NAMES). """
+
+    with open_graph(ctx) as graph:
+        entry = graph.get("objects", object_key(graph, ctx.obj["project_root"], obj))
+
+    if entry is None:
+        print("laze: error: unknown object %s" % obj)
+        sys.exit(1)
+
+    if not names:
+        print("rule = %s" % entry["rule"])
+        print("source = %s" % entry["source"])
+
+    for name, value in sorted(entry["vars"].items()):
+        if names and name not in names:
+            continue
+        print("%s = %s" % (name, value))
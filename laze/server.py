@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+# laze generate server
+#
+# The server doesn't keep a live project. It keeps the parsed buildfiles
+# (invalidated per file by stat) and the contents of the configure cache
+# file (invalidated per file by stat, and per app / builder pair through
+# the configure cache's impact map when loaded). Every request is still a
+# full "laze generate" run in a forked child, which starts with pristine
+# global state but doesn't have to re-import laze, re-parse unchanged
+# buildfiles or re-read the configure cache. Loading, configuring changed
+# pairs and writing the ninja files happen for every request.
+#
+# Both caches are refreshed before each request and after each child exits,
+# so the child's own configure cache is already read when the next request
+# comes in.
+#
+# Clients send a msgpack encoded request containing their arguments, working
+# directory and environment, and then receive the child's output, followed by
+# a zero byte and the exit status.
+
+import os
+import signal
+import socket
+import sys
+
+import click
+import msgpack
+
+from laze.common import determine_dirs
+import laze.constants as const
+import laze.mtimelog
+
+
+def socket_path(build_dir):
+    return os.path.join(build_dir, const.SERVER_SOCKET_NAME)
+
+
+def request(build_dir, argv):
+    """ run "laze generate <argv>" in the server for build_dir.
+
+    Returns the exit status, or None if no server is running.
+    """
+
+    if os.environ.get("LAZE_NO_SERVER"):
+        return None
+
+    path = socket_path(build_dir)
+    if not os.path.exists(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+
+    with sock:
+        req = {
+            "cmd": "generate",
+            "cwd": os.getcwd(),
+            "argv": argv,
+            "env": dict(os.environ),
+        }
+        sock.sendall(msgpack.packb(req, use_bin_type=False))
+        sock.shutdown(socket.SHUT_WR)
+
+        # hold back the last two bytes, as they might be the status trailer
+        out = sys.stdout.buffer
+        pending = b""
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            pending += data
+            out.write(pending[:-2])
+            out.flush()
+            pending = pending[-2:]
+
+    if len(pending) != 2 or pending[0] != 0:
+        print("laze: error: generate server closed connection unexpectedly")
+        return 1
+
+    return pending[1]
+
+
+def refresh_cache(build_dir):
+    import laze.generate as generate
+
+    try:
+        generate.configure_cache = generate.read_configure_cache(
+            os.path.join(build_dir, "laze-configure-cache.mp"),
+            generate.configure_cache,
+        )
+    except (FileNotFoundError, ValueError, msgpack.UnpackException):
+        generate.configure_cache = None
+
+    try:
+        files = laze.mtimelog.log_files(os.path.join(build_dir, "laze-files.mp"))
+    except (FileNotFoundError, ValueError):
+        return
+
+    for filename in files:
+        try:
+            generate.yaml_parse(filename, generate.yaml_cache)
+        except Exception:
+            # errors will be reported by the generate child
+            generate.yaml_cache.pop(filename, None)
+
+
+def handle_generate(conn, req, build_dir):
+    print("laze: server: generate %s" % " ".join(req["argv"]))
+    sys.stdout.flush()
+    refresh_cache(build_dir)
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            import laze.generate as generate
+
+            # run in the client's environment, e.g., for commands run
+            # while generating
+            os.environ.clear()
+            os.environ.update(req["env"])
+            os.environ["LAZE_NO_SERVER"] = "1"
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            os.dup2(conn.fileno(), 1)
+            os.dup2(conn.fileno(), 2)
+            os.chdir(req["cwd"])
+            generate.generate.main(
+                args=req["argv"], prog_name="laze generate", standalone_mode=False
+            )
+            status = 0
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            import traceback
+
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+
+    _, status = os.waitpid(pid, 0)
+    if os.WIFEXITED(status):
+        status = os.WEXITSTATUS(status)
+    else:
+        status = 1
+
+    conn.sendall(bytes([0, status & 0xFF]))
+    refresh_cache(build_dir)
+
+
+def receive(conn):
+    data = b""
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+
+    return msgpack.unpackb(data, raw=False)
+
+
+def serve(path, build_dir):
+    import laze.generate as generate
+
+    generate.yaml_cache = {}
+    refresh_cache(build_dir)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(8)
+
+    try:
+        while True:
+            conn, _ = sock.accept()
+            with conn:
+                try:
+                    req = receive(conn)
+                except (ValueError, msgpack.UnpackException):
+                    continue
+
+                cmd = req.get("cmd")
+                if cmd == "generate":
+                    handle_generate(conn, req, build_dir)
+                elif cmd == "stop":
+                    print("laze: server: stopping")
+                    break
+    finally:
+        sock.close()
+        os.unlink(path)
+
+
+def stop(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print("laze: server: not running")
+        return False
+
+    with sock:
+        sock.sendall(msgpack.packb({"cmd": "stop"}, use_bin_type=False))
+        sock.shutdown(socket.SHUT_WR)
+
+    return True
+
+
+@click.command()
+@click.option("--project-file", "-f", type=click.STRING, envvar="LAZE_PROJECT_FILE")
+@click.option("--project-root", "-r", type=click.STRING, envvar="LAZE_PROJECT_ROOT")
+@click.option(
+    "--build-dir", "-B", type=click.STRING, default="build", envvar="LAZE_BUILDDIR"
+)
+@click.option("--stop", "_stop", is_flag=True, default=False)
+def server(project_file, project_root, build_dir, _stop):
+    args = {
+        "project_file": project_file,
+        "project_root": project_root,
+        "build_dir": build_dir,
+    }
+
+    _, build_dir, project_root, _ = determine_dirs(args)
+    os.chdir(project_root)
+
+    path = socket_path(build_dir)
+
+    if _stop:
+        sys.exit(0 if stop(path) else 1)
+
+    if os.path.exists(path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            print("laze: server: already running")
+            sys.exit(1)
+        except ConnectionRefusedError:
+            # stale socket of a previous server
+            os.unlink(path)
+        finally:
+            sock.close()
+
+    print('laze: server: listening on "%s"' % path)
+    try:
+        serve(path, build_dir)
+    except KeyboardInterrupt:
+        pass
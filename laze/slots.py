@@ -0,0 +1,88 @@
+# generate output slots
+#
+# After each generate run, its outputs are copied into a slot named after the
+# digest of the generate arguments. When "laze build" is called with
+# arguments that don't match the current outputs, but match a slot whose
+# buildfiles are still up-to-date, the slot is restored instead of running
+# generate again. Slots are evicted least recently used first.
+
+import os
+import shutil
+
+import laze.mtimelog
+
+SLOTS_DIR = "variants"
+
+# files making up the outputs of a generate run
+SLOT_FILES = [
+    "build.ninja",
+    "build.ninja.d",
+    "build-args.ninja",
+    "laze-args.yml",
+    "laze-app-per-folder.yml",
+    "laze-tools.yml",
+    "laze-files.mp",
+    "laze-state.mp",
+    "laze-graph.mp",
+    "laze-configure-cache.mp",
+    "laze-stats.json",
+]
+
+
+def slot_dir(build_dir, digest):
+    return os.path.join(build_dir, SLOTS_DIR, digest)
+
+
+def _copy_files(source, target):
+    for filename in SLOT_FILES:
+        try:
+            shutil.copyfile(
+                os.path.join(source, filename), os.path.join(target, filename)
+            )
+        except FileNotFoundError:
+            pass
+
+
+def save_slot(build_dir, digest, max_slots):
+    if max_slots < 1:
+        return
+
+    target = slot_dir(build_dir, digest)
+    os.makedirs(target, exist_ok=True)
+    _copy_files(build_dir, target)
+    os.utime(target)
+
+    evict(build_dir, max_slots)
+
+
+def evict(build_dir, max_slots):
+    slots_dir = os.path.join(build_dir, SLOTS_DIR)
+    slots = []
+    with os.scandir(slots_dir) as it:
+        for entry in it:
+            if entry.is_dir():
+                slots.append((entry.stat().st_mtime_ns, entry.path))
+
+    slots.sort(reverse=True)
+    for _, path in slots[max_slots:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def restore_slot(build_dir, digest):
+    """ restore outputs of a previous generate run with the same arguments.
+
+    Returns True if the slot exists and its buildfiles are unchanged.
+    """
+
+    source = slot_dir(build_dir, digest)
+    try:
+        if not laze.mtimelog.read_log(os.path.join(source, "laze-files.mp"), True):
+            return False
+    except (FileNotFoundError, ValueError):
+        return False
+
+    _copy_files(source, build_dir)
+
+    # mark as recently used
+    os.utime(source)
+    return True
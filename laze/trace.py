@@ -0,0 +1,155 @@
+# Chrome trace-event export
+#
+# Converts laze profiles (see laze.profile) and the jobs ninja recorded in
+# its .ninja_log into trace-event JSON, which can be opened with Perfetto
+# (https://ui.perfetto.dev) or chrome://tracing.
+#
+# Every process gets its own track: the laze build / generate processes show
+# their (nested) phases, configure workers show their spans, and ninja jobs
+# are spread over "slot" tracks, one per concurrently running job.
+
+import json
+import os
+
+TRACE_FILE_NAME = "laze-trace.json"
+
+# pseudo process id for the ninja job tracks
+NINJA_PID = 0
+
+
+def _us(seconds):
+    return int(seconds * 1000000)
+
+
+def _metadata(pid, tid, name, thread_name=None):
+    events = [
+        {"ph": "M", "pid": pid, "tid": tid, "name": "process_name",
+         "args": {"name": name}},
+    ]
+    if thread_name is not None:
+        events.append(
+            {"ph": "M", "pid": pid, "tid": tid, "name": "thread_name",
+             "args": {"name": thread_name}}
+        )
+    return events
+
+
+def profile_events(data, name):
+    """ return trace events for the phases and worker spans of a profile. """
+
+    pid = data["pid"]
+    events = _metadata(pid, pid, name)
+    for phase in data.get("phases", []):
+        events.append(
+            {
+                "name": phase["name"].rsplit("/", 1)[-1],
+                "cat": "phase",
+                "ph": "X",
+                "ts": _us(phase["start"]),
+                "dur": _us(phase["wall"]),
+                "pid": pid,
+                "tid": pid,
+                "args": {"cpu": phase["cpu"]},
+            }
+        )
+
+    worker_pids = set()
+    for worker in data.get("workers", []):
+        worker_pid = worker["pid"]
+        if worker_pid not in worker_pids and worker_pid != pid:
+            worker_pids.add(worker_pid)
+            events.extend(_metadata(worker_pid, worker_pid, "%s worker" % name))
+        events.append(
+            {
+                "name": worker["name"],
+                "cat": "worker",
+                "ph": "X",
+                "ts": _us(worker["start"]),
+                "dur": _us(worker["wall"]),
+                "pid": worker_pid,
+                "tid": worker_pid,
+                "args": {"cpu": worker["cpu"]},
+            }
+        )
+
+    return events
+
+
+def ninja_log_position(filename):
+    """ return the current end of a ninja log, see ninja_log_events(). """
+
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size)
+
+
+def ninja_log_events(filename, position, start):
+    """ return trace events for the jobs ninja logged after position.
+
+    Ninja logs job times relative to its own start, so start must be the
+    time (as in time.time()) ninja was started.
+    """
+
+    current = ninja_log_position(filename)
+    if current is None:
+        return []
+
+    offset = 0
+    if position is not None:
+        inode, offset = position
+        if current[0] != inode:
+            # ninja has recompacted the log. the entries of this run are
+            # still at its end, but the start of the run is not known.
+            print("laze: .ninja_log was recompacted, ninja jobs not traced")
+            return []
+
+    # one edge with multiple outputs gets one log line per output
+    jobs = {}
+    with open(filename) as f:
+        f.seek(offset)
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) != 5:
+                continue
+            job_start, job_end, _, output, cmdhash = fields
+            key = (int(job_start), int(job_end), cmdhash)
+            jobs.setdefault(key, []).append(output)
+
+    # assign each job to the first slot that is free at its start
+    events = []
+    slot_ends = []
+    for (job_start, job_end, _), outputs in sorted(jobs.items()):
+        for slot, slot_end in enumerate(slot_ends):
+            if slot_end <= job_start:
+                break
+        else:
+            slot = len(slot_ends)
+            slot_ends.append(0)
+            events.extend(_metadata(NINJA_PID, slot + 1, "ninja", "slot %s" % slot))
+        slot_ends[slot] = job_end
+
+        events.append(
+            {
+                "name": outputs[0],
+                "cat": "job",
+                "ph": "X",
+                "ts": _us(start) + job_start * 1000,
+                "dur": (job_end - job_start) * 1000,
+                "pid": NINJA_PID,
+                "tid": slot + 1,
+                "args": {"outputs": outputs},
+            }
+        )
+
+    return events
+
+
+def write(build_dir, events):
+    filename = os.path.join(build_dir, TRACE_FILE_NAME)
+    with open(filename, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return filename
@@ -1,10 +1,5 @@
-import hashlib
-import json
 import os
-import traceback
-import collections
-
-from .yaml import yaml, Dumper, Loader
+import collections.abc
 
 from collections import defaultdict
 from itertools import product, chain
@@ -21,6 +16,14 @@ def listify(something):
     return something
 
 
+def boolify(value):
+    """ interpret a yaml (BaseLoader) scalar as boolean. """
+
+    if type(value) == str:
+        return value.lower() in {"true", "yes", "on", "1"}
+    return bool(value)
+
+
 def uniquify(seq):
     """ make sure each member of seq is in there only once.
 
@@ -34,6 +37,8 @@ def uniquify(seq):
 
 
 def print_exception():
+    import traceback
+
     traceback.print_exc()
 
 
@@ -245,6 +250,10 @@ def split(_list, splitter=","):
 
 
 def _dict_digest(_dict):
+    # imported here to keep "laze build" startup fast
+    import hashlib
+    import json
+
     return hashlib.sha1(json.dumps(_dict, sort_keys=True).encode("utf-8"))
 
 
@@ -270,6 +279,9 @@ def dump_dict(path, data):
     if type(data) == defaultdict:
         data = default_to_regular(data)
 
+    # PyYAML is slow to import, so only do it when needed
+    from .yaml import yaml, Dumper
+
     with open(path, "w") as f:
         yaml.dump(data, f, Dumper=Dumper)
 
@@ -281,12 +293,14 @@ def load_dict(path):
         path = os.path.join(*path)
     path = path + ".yml"
 
+    from .yaml import yaml, Loader
+
     return yaml.load(open(path), Loader=Loader)
 
 
 def deep_update(d, u):
     for k, v in u.items():
-        if isinstance(v, collections.Mapping):
+        if isinstance(v, collections.abc.Mapping):
             d[k] = deep_update(d.get(k, {}), v)
         else:
             d[k] = v
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+# laze watch mode
+#
+# Watches all buildfiles recorded by the last generate run (and the folders
+# containing them or declared as subdirs, in order to notice new buildfiles)
+# and re-runs generate when they change, so a following "laze build" only
+# needs to run ninja.
+#
+# Uses inotify on Linux, otherwise falls back to polling.
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import subprocess
+import sys
+import time
+
+import click
+
+from laze.common import determine_dirs
+import laze.constants as const
+import laze.mtimelog
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+
+_event = struct.Struct("iIII")
+
+
+class Inotify(object):
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._rm_watch = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1() failed")
+        self.watches = {}
+
+    def watch(self, folders):
+        """ make the set of watched folders equal to folders. """
+
+        current = {folder: wd for wd, folder in self.watches.items()}
+        for folder, wd in current.items():
+            if folder not in folders:
+                self._rm_watch(self.fd, wd)
+                self.watches.pop(wd, None)
+
+        for folder in folders:
+            if folder in current:
+                continue
+            wd = self._add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd >= 0:
+                self.watches[wd] = folder
+
+    def wait(self, timeout=None):
+        """ wait for events, return list of (folder, name) tuples. """
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _event.unpack_from(data, offset)
+            offset += _event.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            folder = self.watches.get(wd)
+            if folder is None:
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+            events.append((folder, os.fsdecode(name)))
+
+        return events
+
+
+class Poller(object):
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.folders = set()
+        self.state = {}
+
+    @staticmethod
+    def _stat(folder):
+        res = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_file():
+                        res[entry.name] = entry.stat().st_mtime_ns
+        except FileNotFoundError:
+            pass
+        return res
+
+    def watch(self, folders):
+        self.folders = set(folders)
+        self.state = {folder: self._stat(folder) for folder in self.folders}
+
+    def wait(self, timeout=None):
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        events = []
+        for folder in self.folders:
+            old = self.state.get(folder, {})
+            new = self._stat(folder)
+            self.state[folder] = new
+            for name in set(old) | set(new):
+                if old.get(name) != new.get(name):
+                    events.append((folder, name))
+
+        return events
+
+
+def get_watch_set(files_log, build_dir):
+    try:
+        files = set(laze.mtimelog.log_files(files_log))
+        dirs = laze.mtimelog.log_dirs(files_log)
+    except (FileNotFoundError, ValueError):
+        files = set()
+        dirs = {}
+
+    # imported buildfiles are only changed by generate itself.
+    # (imports with "folder_override" might be logged with absolute paths)
+    build_dir = os.path.abspath(build_dir)
+
+    def in_build_dir(path):
+        return os.path.commonpath([os.path.abspath(path), build_dir]) == build_dir
+
+    files = {filename for filename in files if not in_build_dir(filename)}
+    folders = {os.path.dirname(filename) or "." for filename in files}
+
+    # declared subdirs and the folders leading to them, so that e.g.,
+    # re-creating one is noticed
+    buildfile_names = {const.BUILDFILE_NAME, const.PROJECTFILE_NAME}
+    for folder, names in dirs.items():
+        if in_build_dir(folder):
+            continue
+        for name in names:
+            if name in buildfile_names:
+                continue
+            parts = os.path.normpath(name).split(os.sep)
+            for n in range(1, len(parts) + 1):
+                folders.add(os.path.normpath(os.path.join(folder, *parts[:n])))
+
+    return files, folders
+
+
+def is_relevant(files, folders, folder, name):
+    if name in {const.BUILDFILE_NAME, const.PROJECTFILE_NAME}:
+        return True
+
+    filename = name if folder == "." else os.path.join(folder, name)
+    return filename in files or filename in folders
+
+
+@click.command()
+@click.option("--project-file", "-f", type=click.STRING, envvar="LAZE_PROJECT_FILE")
+@click.option("--project-root", "-r", type=click.STRING, envvar="LAZE_PROJECT_ROOT")
+@click.option(
+    "--build-dir", "-B", type=click.STRING, default="build", envvar="LAZE_BUILDDIR"
+)
+@click.option("--build", "_build", is_flag=True, default=False,
+              help="also run ninja after re-generating")
+@click.option("--debounce", type=click.FLOAT, default=0.3, envvar="LAZE_DEBOUNCE",
+              help="seconds without changes before re-generating")
+@click.option("--poll", is_flag=True, default=False,
+              help="poll instead of using inotify")
+def watch(project_file, project_root, build_dir, _build, debounce, poll):
+    args = {
+        "project_file": project_file,
+        "project_root": project_root,
+        "build_dir": build_dir,
+    }
+
+    _, build_dir, project_root, _ = determine_dirs(args)
+    os.chdir(project_root)
+
+    args_file = os.path.join(build_dir, "laze-args.yml")
+    files_log = os.path.join(build_dir, "laze-files.mp")
+    if not os.path.isfile(args_file):
+        print('laze: watch: "%s" not found, run "laze build" first.' % args_file)
+        sys.exit(1)
+
+    if poll or not sys.platform.startswith("linux"):
+        watcher = Poller()
+    else:
+        try:
+            watcher = Inotify()
+        except (OSError, AttributeError):
+            watcher = Poller()
+
+    files, folders = get_watch_set(files_log, build_dir)
+    watcher.watch(folders)
+    print(
+        "laze: watch: watching %s buildfiles in %s folders"
+        % (len(files), len(folders))
+    )
+
+    try:
+        while True:
+            events = watcher.wait()
+            if not any(is_relevant(files, folders, *event) for event in events):
+                continue
+
+            # debounce bursts of changes (e.g., "git checkout")
+            while watcher.wait(debounce):
+                pass
+
+            print("laze: watch: buildfiles changed, re-generating")
+            res = subprocess.call(
+                [sys.argv[0], "generate", "--args-file", os.path.abspath(args_file)]
+            )
+            if res == 0 and _build:
+                subprocess.call(["ninja", "-f", os.path.join(build_dir, "build.ninja")])
+
+            # drop events caused by generate or the build itself
+            while watcher.wait(0):
+                pass
+
+            files, folders = get_watch_set(files_log, build_dir)
+            watcher.watch(folders)
+
+    except KeyboardInterrupt:
+        pass
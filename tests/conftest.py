@@ -0,0 +1,119 @@
+# test helpers
+#
+# Tests write small laze projects to a temporary folder and generate them
+# in-process, see laze.generate.Project. project_files() returns the files
+# of the common test project, which tests adapt to what they need.
+
+import os
+import textwrap
+
+import pytest
+
+from laze.generate import Project
+
+
+APP = """
+    app:
+        - name: a
+          sources:
+              - main.c
+          depends:
+              - m
+    """
+
+MODULE = """
+    module:
+        - name: m
+          sources:
+              - m1.c
+              - m2.c
+    """
+
+
+def project_files(root="", app=APP, module=MODULE, subdirs=("app", "m"), files=None):
+    """ return {filename: content} of a test project.
+
+    The project imports the default rules and builders, root is appended to
+    its laze-project.yml. app and module are the buildfiles of the "app" and
+    "m" subdirs, None leaves them out. files are added as they are.
+    """
+
+    project = "import:\n    - $laze/default\n"
+    if subdirs:
+        project += "\nsubdirs:\n" + "".join("    - %s\n" % s for s in subdirs)
+
+    result = {"laze-project.yml": project + textwrap.dedent(root)}
+    if app is not None:
+        result["app/laze.yml"] = textwrap.dedent(app)
+    if module is not None:
+        result["m/laze.yml"] = textwrap.dedent(module)
+    for filename, content in (files or {}).items():
+        result[filename] = textwrap.dedent(content)
+
+    return result
+
+
+def two_app_files(files=None, **kwargs):
+    """ project_files() plus app "b" in the "b" subdir, also using "m". """
+
+    files = dict(files or {})
+    files["b/laze.yml"] = APP.replace("name: a", "name: b")
+    return project_files(subdirs=("app", "b", "m"), files=files, **kwargs)
+
+
+class ProjectDir(object):
+    def __init__(self, root):
+        self.root = root
+
+    def write(self, files):
+        """ write {filename: content} to the project folder. """
+
+        for filename, content in files.items():
+            path = os.path.join(self.root, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(textwrap.dedent(content))
+
+    def write_project(self, **kwargs):
+        """ write the common test project, see project_files(). """
+
+        files = project_files(**kwargs)
+        self.write(files)
+        return files
+
+    def path(self, filename):
+        return os.path.join(self.root, filename)
+
+    def read(self, filename):
+        with open(self.path(filename)) as f:
+            return f.read()
+
+    def generate(self, write=False, **args):
+        """ generate the project, returns (project, build graph). """
+
+        args.setdefault("_global", True)
+        project = Project(args)
+        return project, project.generate(write=write)
+
+
+def builds(graph, rule=None):
+    """ return the build statements of graph, optionally only those of rule. """
+
+    return [build for build in graph.builds if rule is None or build["rule"] == rule]
+
+
+def outputs(graph, rule=None):
+    return sorted(output for build in builds(graph, rule) for output in build["outputs"])
+
+
+@pytest.fixture
+def project_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return ProjectDir(tmp_path)
+
+
+def ninja_edges(text):
+    """ return the statements of a ninja file, independent of their order. """
+
+    text = text.replace("$\n", "")
+    return sorted(" ".join(sorted(line.split())) for line in text.splitlines())
@@ -0,0 +1,56 @@
+from conftest import APP, MODULE, builds
+
+# "m" is archived, "n" isn't
+APP_MN = APP + """
+              - n
+    """
+
+MODULES = MODULE + """
+          archive: true
+        - name: n
+          sources:
+              - n.c
+    """
+
+
+def test_archive(project_dir):
+    project_dir.write_project(app=APP_MN, module=MODULES)
+    _, graph = project_dir.generate()
+
+    (archive,) = builds(graph, "ARCHIVE")
+    assert archive["outputs"][0].endswith(".a")
+    assert len(archive["inputs"]) == 2
+
+    (link,) = builds(graph, "LINK_ARCHIVES")
+    assert link["outputs"] == ["build/bin/host/a/a.elf"]
+    # only the archive is linked as whole archive, other objects stay inputs
+    assert link["variables"]["archives"] == archive["outputs"][0]
+    assert archive["outputs"] == link["implicit"]
+    assert len(link["inputs"]) == 2
+    assert not set(link["inputs"]) & set(archive["inputs"])
+    assert not builds(graph, "LINK")
+
+
+def test_archive_rules(project_dir):
+    project_dir.write_project(app=APP_MN, module=MODULES)
+    _, graph = project_dir.generate()
+
+    # AR comes from the default context, --whole-archive only wraps archives
+    (archive,) = builds(graph, "ARCHIVE")
+    assert archive["variables"]["AR"] == "ar"
+    assert (
+        "-Wl,--whole-archive ${archives} -Wl,--no-whole-archive ${libs}"
+        in graph.rules["LINK_ARCHIVES"]["command"]
+    )
+
+
+def test_without_archive(project_dir):
+    project_dir.write_project(
+        app=APP_MN, module=MODULES.replace("archive: true", "")
+    )
+    _, graph = project_dir.generate()
+
+    assert not builds(graph, "ARCHIVE")
+    assert not builds(graph, "LINK_ARCHIVES")
+    (link,) = builds(graph, "LINK")
+    assert len(link["inputs"]) == 4
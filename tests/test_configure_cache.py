@@ -0,0 +1,94 @@
+import shutil
+
+from conftest import APP, MODULE, ninja_edges, two_app_files
+
+PROJECT = two_app_files(
+    root="""
+        builder:
+            - name: b1
+              parent: host
+              pch: common.h
+        """,
+    module=MODULE
+    + """
+          unity: true
+          archive: true
+    """,
+    files={"common.h": ""},
+)
+
+
+def regenerate(project_dir, **args):
+    project, _ = project_dir.generate(write=True, **args)
+    return project, project_dir.read("build/build.ninja")
+
+
+def full_generate(project_dir, **args):
+    shutil.rmtree(project_dir.path("build"))
+    return regenerate(project_dir, **args)
+
+
+def test_reuse(project_dir):
+    project_dir.write(PROJECT)
+    regenerate(project_dir)
+
+    project_dir.write({"b/laze.yml": PROJECT["b/laze.yml"] + "\n"})
+    project, ninja = regenerate(project_dir)
+
+    # b is configured again for both builders
+    assert sorted(project.configure_cache["pairs"]) == ["a:b1", "a:host"]
+    assert ninja_edges(ninja) == ninja_edges(full_generate(project_dir)[1])
+
+
+def test_reuse_object_store(project_dir):
+    project_dir.write(PROJECT)
+    regenerate(project_dir, object_store=True)
+
+    project_dir.write({"app/laze.yml": PROJECT["app/laze.yml"] + "\n"})
+    project, ninja = regenerate(project_dir, object_store=True)
+
+    assert sorted(project.configure_cache["pairs"]) == ["b:b1", "b:host"]
+    assert ninja_edges(ninja) == ninja_edges(
+        full_generate(project_dir, object_store=True)[1]
+    )
+
+
+def test_module_change(project_dir):
+    project_dir.write(PROJECT)
+    regenerate(project_dir)
+
+    project_dir.write({"m/laze.yml": PROJECT["m/laze.yml"] + "\n"})
+    project, _ = regenerate(project_dir)
+
+    assert not project.configure_cache.get("pairs")
+
+
+def test_global_change(project_dir):
+    project_dir.write(PROJECT)
+    regenerate(project_dir)
+
+    project_dir.write({"laze-project.yml": PROJECT["laze-project.yml"] + "\n"})
+    project, _ = regenerate(project_dir)
+
+    assert project.configure_cache == {}
+
+
+def test_args_change(project_dir):
+    project_dir.write(PROJECT)
+    regenerate(project_dir)
+
+    project, _ = regenerate(project_dir, builders=["b1"])
+
+    assert project.configure_cache == {}
+
+
+def test_duplicate_app_names(project_dir, capsys):
+    # both apps are called "a"
+    project_dir.write_project(subdirs=("app", "b", "m"), files={"b/laze.yml": APP})
+    regenerate(project_dir)
+    project, graph = project_dir.generate()
+
+    assert "re-using" not in capsys.readouterr().out
+    links = [build for build in graph.builds if build["rule"] == "LINK"]
+    assert len(links) == 2
+    assert links[0]["inputs"] != links[1]["inputs"]
@@ -0,0 +1,90 @@
+import os
+
+from conftest import MODULE, outputs
+
+UNITY_MODULE = MODULE + """
+          unity: true
+    """
+
+
+def test_generate_without_write(project_dir):
+    project_dir.write_project(module=UNITY_MODULE)
+    os.chdir("app")
+
+    project, graph = project_dir.generate(write=False)
+
+    assert os.getcwd() == project_dir.path("app")
+    assert not os.path.exists(project_dir.path("build"))
+    assert outputs(graph, "LINK") == ["build/bin/host/a/a.elf"]
+    # generated sources are known, but not written
+    assert project.generated_files == {"build/unity/m/m_0.c"}
+
+
+def test_generate_write(project_dir):
+    project_dir.write_project(module=UNITY_MODULE)
+
+    project, graph = project_dir.generate(write=True)
+
+    for filename in (
+        "build.ninja",
+        "laze-args.yml",
+        "laze-files.mp",
+        "laze-state.mp",
+        "laze-stats.json",
+        "unity/m/m_0.c",
+    ):
+        assert os.path.isfile(project_dir.path(os.path.join("build", filename)))
+
+    assert "build build/bin/host/a/a.elf: LINK" in project_dir.read("build/build.ninja")
+
+
+def test_generate_dump_data(project_dir):
+    project_dir.write_project(module=UNITY_MODULE)
+
+    project_dir.generate(write=True, dump_data=True)
+
+    lines = project_dir.read("build/laze-data.jsonl").splitlines()
+    assert len(lines) == 1
+    assert '"app":"a"' in lines[0]
+
+
+def test_dump_data_streamed(project_dir, monkeypatch):
+    from laze.generate import App, Project
+
+    project_dir.write_project(
+        root="""
+            builder:
+                - name: b1
+                  parent: host
+                - name: b2
+                  parent: host
+            """,
+        module=UNITY_MODULE,
+    )
+
+    events = []
+    build = App.build
+    dump_data = Project.dump_data
+
+    def _build(self, builder, builderdict):
+        events.append(("build", builder.name))
+        return build(self, builder, builderdict)
+
+    def _dump_data(self, app_name, builder_name, builderdict):
+        events.append(("dump", builder_name))
+        return dump_data(self, app_name, builder_name, builderdict)
+
+    monkeypatch.setattr(App, "build", _build)
+    monkeypatch.setattr(Project, "dump_data", _dump_data)
+
+    project, _ = project_dir.generate(write=True, dump_data=True)
+
+    # each pair is dumped before the next builder is configured
+    assert [event for event, _ in events] == ["build", "dump"] * 3
+    assert sorted(events[::2]) == [("build", "b1"), ("build", "b2"), ("build", "host")]
+    assert [name for _, name in events[::2]] == [name for _, name in events[1::2]]
+    assert len(project_dir.read("build/laze-data.jsonl").splitlines()) == 3
+
+    # only module names are kept
+    for result in project.configure_results.values():
+        assert result[0] == {"modules": ["a", "m"]}
@@ -0,0 +1,43 @@
+import pytest
+import yaml
+
+from laze.index import Index, write_index
+
+
+def test_roundtrip(tmp_path):
+    filename = str(tmp_path / "index.mp")
+    write_index(
+        filename,
+        {"args": {"apps": ["a"]}},
+        {"folders": {"a": {"a": {"host": "a.elf"}}, "b": {}}, "tools": {}},
+    )
+
+    with Index(filename) as index:
+        assert index.data == {"args": {"apps": ["a"]}}
+        assert sorted(index.keys("folders")) == ["a", "b"]
+        assert index.get("folders", "b") == {}
+        assert index.get("folders", "a") == {"a": {"host": "a.elf"}}
+        assert index.get("folders", "c", "missing") == "missing"
+        assert list(index.keys("tools")) == []
+
+
+def test_not_an_index(tmp_path):
+    filename = tmp_path / "index.mp"
+    filename.write_bytes(b"something else")
+
+    with pytest.raises(ValueError):
+        Index(str(filename))
+
+
+def test_state(project_dir):
+    project_dir.write_project()
+    project, _ = project_dir.generate(write=True)
+
+    with open(project_dir.path("build/laze-app-per-folder.yml")) as f:
+        per_folder = yaml.safe_load(f)
+
+    with Index(project_dir.path("build/laze-state.mp")) as state:
+        assert state.data["args"] == project.args
+        assert sorted(state.keys("folders")) == sorted(per_folder)
+        for folder, apps in per_folder.items():
+            assert state.get("folders", folder) == apps
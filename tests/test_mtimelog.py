@@ -0,0 +1,156 @@
+import os
+
+import pytest
+
+import laze.mtimelog as mtimelog
+
+from conftest import APP
+
+
+def bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+
+def write(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_unchanged(tmp_path):
+    write(tmp_path / "laze.yml", "a")
+    log = str(tmp_path / "log.mp")
+    mtimelog.write_log(log, [str(tmp_path / "laze.yml")], {str(tmp_path): ()})
+
+    assert mtimelog.read_log(log, True) is True
+    assert mtimelog.read_log(log) == []
+
+
+def test_file_changed(tmp_path):
+    filename = str(tmp_path / "laze.yml")
+    write(filename, "a")
+    log = str(tmp_path / "log.mp")
+    mtimelog.write_log(log, [filename])
+
+    write(filename, "ab")
+    bump_mtime(filename)
+
+    assert mtimelog.read_log(log, True) is False
+    assert mtimelog.read_log(log) == [filename]
+
+
+def test_content_hash(tmp_path):
+    filename = str(tmp_path / "laze.yml")
+    write(filename, "a")
+    log = str(tmp_path / "log.mp")
+    mtimelog.write_log(log, [filename], hashed=True)
+
+    bump_mtime(filename)
+    assert mtimelog.read_log(log, True) is True
+
+    write(filename, "b")
+    bump_mtime(filename)
+    assert mtimelog.read_log(log, True) is False
+
+
+def test_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(mtimelog, "BATCH_SIZE", 2)
+    filenames = [str(tmp_path / ("%s.yml" % n)) for n in range(7)]
+    for filename in filenames:
+        write(filename, "a")
+    log = str(tmp_path / "log.mp")
+    mtimelog.write_log(log, filenames)
+
+    assert mtimelog.read_log(log, True) is True
+
+    write(filenames[5], "ab")
+    bump_mtime(filenames[5])
+
+    assert mtimelog.read_log(log, True) is False
+    assert mtimelog.read_log(log) == [filenames[5]]
+
+
+def test_dir_new_buildfile(tmp_path):
+    folder = str(tmp_path)
+    log = str(tmp_path / "log.mp")
+    mtimelog.write_log(log, [], {folder: ()})
+
+    write(tmp_path / "laze-project.yml", "")
+    bump_mtime(folder)
+
+    assert mtimelog.read_log(log) == [folder]
+
+
+def test_dir_new_subdir(tmp_path):
+    folder = str(tmp_path)
+    log = str(tmp_path / "log.mp")
+    mtimelog.write_log(log, [], {folder: ["sub"]})
+
+    os.mkdir(tmp_path / "sub")
+    bump_mtime(folder)
+
+    assert mtimelog.read_log(log) == [folder]
+
+
+def test_dir_other_changes_ignored(tmp_path):
+    folder = str(tmp_path)
+    log = str(tmp_path / "log.mp")
+    mtimelog.write_log(log, [], {folder: ["sub"]})
+
+    os.mkdir(tmp_path / "bin")
+    write(tmp_path / "main.c", "")
+    bump_mtime(folder)
+
+    assert mtimelog.read_log(log) == []
+    # the new folder mtime has been stored
+    assert mtimelog.load_log(log)["dirs"][folder][0] == os.stat(folder).st_mtime_ns
+    assert mtimelog.log_dirs(log) == {folder: ["laze-project.yml", "laze.yml", "sub"]}
+
+
+def test_removed(tmp_path):
+    filename = str(tmp_path / "laze.yml")
+    write(filename, "a")
+    log = str(tmp_path / "log.mp")
+    mtimelog.write_log(log, [filename])
+
+    os.remove(filename)
+    with pytest.raises(FileNotFoundError):
+        mtimelog.read_log(log, True)
+
+
+def test_outdated_version(tmp_path):
+    filename = str(tmp_path / "laze.yml")
+    write(filename, "a")
+    log = str(tmp_path / "log.mp")
+    mtimelog.write_log(log, [filename])
+    data = mtimelog.load_log(log)
+    data["version"] = mtimelog.LOG_VERSION - 1
+    mtimelog._write(log, data)
+
+    assert mtimelog.read_log(log, True) is False
+    assert mtimelog.log_files(log) == [filename]
+
+
+def test_generate_log(project_dir):
+    project_dir.write_project(
+        subdirs=("m", "sub"), app=None, files={"sub/laze.yml": APP}
+    )
+    project_dir.generate(write=True)
+    log = project_dir.path("build/laze-files.mp")
+
+    assert mtimelog.log_dirs(log)["."] == ["laze-project.yml", "laze.yml", "m", "sub"]
+
+    # e.g., "bindir: ./bin"
+    os.mkdir(project_dir.path("bin"))
+    bump_mtime(project_dir.path("."))
+    assert mtimelog.read_log(log) == []
+
+    # not a declared subdir
+    os.mkdir(project_dir.path("sub/sub2"))
+    project_dir.write({"sub/sub2/laze.yml": ""})
+    bump_mtime(project_dir.path("sub"))
+    assert mtimelog.read_log(log) == []
+
+    project_dir.write({"sub/laze-project.yml": ""})
+    bump_mtime(project_dir.path("sub"))
+    assert mtimelog.read_log(log) == ["sub"]
@@ -0,0 +1,69 @@
+from conftest import APP, builds, two_app_files
+
+# a builder with precompiled header, and an assembly source in app "a"
+PROJECT = two_app_files(
+    root="""
+        builder:
+            - name: b1
+              parent: host
+              pch: common.h
+        """,
+    app=APP.replace("- main.c", "- main.c\n              - s.S"),
+    files={"common.h": ""},
+)
+
+
+def link_inputs(graph, builder, app):
+    (link,) = [
+        build
+        for build in builds(graph)
+        if build["outputs"] == ["build/bin/%s/%s/%s.elf" % (builder, app, app)]
+    ]
+    return link["inputs"]
+
+
+def compiles(graph, rule, source):
+    return [build for build in builds(graph, rule) if build["inputs"] == [source]]
+
+
+def test_shared_objects(project_dir):
+    project_dir.write(PROJECT)
+    _, graph = project_dir.generate(object_store=True)
+
+    # identical compile commands share one object
+    a_objects = set(link_inputs(graph, "host", "a"))
+    shared = a_objects & set(link_inputs(graph, "host", "b"))
+    assert len(shared) == 2
+    assert all(output.startswith("build/objects/") for output in shared)
+
+    # s.S is built without precompiled header, so both builders share it
+    (s_object,) = compiles(graph, "ASM", "app/s.S")
+    assert s_object["outputs"][0] in link_inputs(graph, "host", "a")
+    assert s_object["outputs"][0] in link_inputs(graph, "b1", "a")
+
+
+def test_pch_builder_collision(project_dir):
+    project_dir.write(PROJECT)
+    _, graph = project_dir.generate(object_store=True)
+
+    # same source and flags, but b1 includes a precompiled header
+    objects = {}
+    for build in compiles(graph, "CC", "m/m1.c"):
+        objects.setdefault(bool(build["implicit"]), set()).update(build["outputs"])
+
+    assert len(objects[False]) == 1
+    assert len(objects[True]) == 1
+    assert objects[True] != objects[False]
+    assert objects[False] < set(link_inputs(graph, "host", "b"))
+    assert not set(link_inputs(graph, "b1", "b")) & objects[False]
+
+
+def test_without_object_store(project_dir):
+    project_dir.write(PROJECT)
+    _, graph = project_dir.generate()
+
+    assert not [
+        build
+        for build in builds(graph)
+        if build["outputs"][0].startswith("build/objects/")
+    ]
@@ -0,0 +1,138 @@
+import pytest
+
+from conftest import APP, MODULE, builds
+from laze.common import ParseError
+
+# "a" uses "m" and "n", "b" only uses "m"
+APPS = APP + """
+              - n
+        - name: b
+          sources:
+              - main.c
+          depends:
+              - m
+    """
+
+MODULES = MODULE + """
+              - s.S
+          pch: %(pch)s
+        - name: n
+          pch: %(pch)s
+          sources:
+              - n.c
+    """
+
+
+def write_project(project_dir, root="", pch="common.h", source="m1.c"):
+    project_dir.write_project(
+        root=root,
+        app=APPS,
+        module=(MODULES % {"pch": pch}).replace("m1.c", source),
+        files={"m/common.h": ""},
+    )
+
+
+def compile_of(graph, source):
+    (build,) = [
+        build
+        for build in builds(graph)
+        if build["rule"] in ("CC", "ASM") and build["inputs"] == [source]
+    ]
+    return build
+
+
+def test_pch(project_dir, capsys):
+    write_project(project_dir)
+    _, graph = project_dir.generate()
+
+    # one precompiled header per module, shared by all apps using it
+    pchs = {build["outputs"][0]: build for build in builds(graph, "PCH")}
+    assert len(pchs) == 2
+    for pch_file, build in pchs.items():
+        assert build["inputs"] == ["m/common.h"]
+        assert pch_file.endswith("/common.h.gch")
+    m_pch, n_pch = sorted(pchs)
+    assert m_pch.startswith("build/pch/m/m/")
+    assert n_pch.startswith("build/pch/m/n/")
+
+    m_c = compile_of(graph, "m/m1.c")
+    assert m_pch in m_c["implicit"]
+    assert m_c["variables"]["CFLAGS"].startswith(
+        "-include %s -Winvalid-pch " % m_pch[: -len(".gch")]
+    )
+    assert n_pch in compile_of(graph, "m/n.c")["implicit"]
+
+    # app sources don't inherit the modules' headers
+    for build in builds(graph, "CC"):
+        if build["inputs"] == ["app/main.c"]:
+            assert not build["implicit"]
+
+    # ASM can't use it, which is reported once
+    s_S = compile_of(graph, "m/s.S")
+    assert not s_S["implicit"]
+    assert "-include" not in s_S["variables"].get("CFLAGS", "")
+    out = capsys.readouterr().out
+    assert out.count("rule ASM doesn't support precompiled headers") == 1
+
+
+def test_pch_disabled(project_dir):
+    write_project(
+        project_dir,
+        root="""
+            builder:
+                - name: b1
+                  parent: host
+                  pch: m/common.h
+            """,
+        pch="false",
+    )
+    _, graph = project_dir.generate(builders=["b1"])
+
+    # only the apps' sources use the builder's header
+    pchs = sorted(build["outputs"][0] for build in builds(graph, "PCH"))
+    assert len(pchs) == 2
+    assert pchs[0].startswith("build/pch/app/a/")
+    assert pchs[1].startswith("build/pch/app/b/")
+    assert not compile_of(graph, "m/m1.c")["implicit"]
+
+
+def test_pch_unknown_rule(project_dir):
+    write_project(
+        project_dir,
+        root="""
+            rule:
+                - name: CXX
+                  in: '.cpp'
+                  out: '.o'
+                  pch: PCH_CXX
+                  cmd: '${CXX} ${CFLAGS} -c ${in} -o ${out}'
+            """,
+        source="m1.cpp",
+    )
+
+    with pytest.raises(SystemExit):
+        project_dir.generate()
+
+
+@pytest.mark.parametrize("pch", ["[common.h]", "{header: common.h}"])
+def test_pch_bad_type(project_dir, pch):
+    write_project(project_dir, pch=pch)
+
+    with pytest.raises(ParseError, match='module m: "pch" must be a header'):
+        project_dir.generate()
+
+
+def test_pch_bad_type_context(project_dir):
+    write_project(
+        project_dir,
+        root="""
+            builder:
+                - name: b1
+                  parent: host
+                  pch:
+                      - m/common.h
+            """,
+    )
+
+    with pytest.raises(ParseError, match='builder b1: "pch" must be a header'):
+        project_dir.generate()
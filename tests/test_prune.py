@@ -0,0 +1,47 @@
+from conftest import MODULE, outputs
+
+ROOT = """
+    builder:
+        - name: b1
+          parent: host
+        - name: b2
+          parent: host
+          vars:
+              CFLAGS: -DB2
+
+    context:
+        - name: c2
+          parent: b2
+          vars:
+              CFLAGS: -DC2
+    """
+
+MODULES = MODULE + """
+        - name: unused
+          sources:
+              - unused.c
+    """
+
+
+def test_prune_builders(project_dir):
+    project_dir.write_project(root=ROOT, module=MODULES)
+    project, graph = project_dir.generate(builders=["b1"])
+
+    assert set(project.contexts) == {"default", "host", "b1"}
+    assert outputs(graph, "LINK") == ["build/bin/b1/a/a.elf"]
+
+
+def test_prune_keeps_contexts(project_dir):
+    project_dir.write_project(root=ROOT, module=MODULES)
+    project, graph = project_dir.generate(builders=["b2"])
+
+    assert set(project.contexts) == {"default", "host", "b2", "c2"}
+    assert outputs(graph, "LINK") == ["build/bin/b2/a/a.elf"]
+
+
+def test_prune_modules(project_dir):
+    project_dir.write_project(root=ROOT, module=MODULES)
+    project, graph = project_dir.generate(apps=["a"])
+
+    assert "unused" not in {module.name for module in project.modules}
+    assert not [output for output in outputs(graph) if "unused" in output]
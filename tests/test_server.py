@@ -0,0 +1,96 @@
+import os
+import socket
+import threading
+
+import laze.generate as generate
+import laze.server
+
+from conftest import ninja_edges, two_app_files
+
+
+def test_request_without_server(project_dir):
+    assert laze.server.request("build", ["-g"]) is None
+
+
+def test_request(project_dir, monkeypatch, capfd):
+    monkeypatch.setenv("LAZE_VARIANT_SLOTS", "3")
+    os.mkdir("build")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(laze.server.socket_path("build"))
+    server.listen(1)
+    requests = []
+
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            requests.append(laze.server.receive(conn))
+            conn.sendall(b"output\n" + bytes([0, 3]))
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        assert laze.server.request("build", ["-g"]) == 3
+    finally:
+        thread.join()
+        server.close()
+
+    (req,) = requests
+    assert req["argv"] == ["-g"]
+    assert req["cwd"] == os.getcwd()
+    assert req["env"]["LAZE_VARIANT_SLOTS"] == "3"
+    assert capfd.readouterr().out == "output\n"
+
+
+def test_server_argv(monkeypatch):
+    monkeypatch.setenv("LAZE_VARIANT_SLOTS", "3")
+    ctx = generate.generate.make_context(
+        "generate", ["-A", "args.yml", "--profile", "-l", "-b", "b1", "-b", "b2"]
+    )
+
+    assert generate.server_argv(ctx, "/build/args.yml") == [
+        "--args-file",
+        "/build/args.yml",
+        "--builders",
+        "b1",
+        "--builders",
+        "b2",
+        "--variant-slots",
+        "3",
+        "--profile",
+    ]
+
+
+def test_refresh_cache(project_dir, monkeypatch):
+    monkeypatch.setattr(generate, "yaml_cache", {})
+    monkeypatch.setattr(generate, "configure_cache", None)
+
+    files = two_app_files()
+    project_dir.write(files)
+    project_dir.generate(write=True)
+    ninja = project_dir.read("build/build.ninja")
+
+    laze.server.refresh_cache("build")
+    preloaded = generate.configure_cache
+    assert preloaded is not None
+    assert any(name.endswith("m/laze.yml") for name in generate.yaml_cache)
+
+    # unchanged file, nothing is read again
+    laze.server.refresh_cache("build")
+    assert generate.configure_cache is preloaded
+
+    project_dir.write({"b/laze.yml": files["b/laze.yml"] + "\n"})
+    project = generate.Project(
+        {"_global": True},
+        yaml_cache=generate.yaml_cache,
+        configure_cache=preloaded,
+    )
+    project.generate(write=True)
+
+    assert sorted(project.configure_cache["pairs"]) == ["a:host"]
+    assert ninja_edges(project_dir.read("build/build.ninja")) == ninja_edges(ninja)
+
+    # loading doesn't modify the preloaded contents
+    assert sorted(preloaded[1]["pairs"]) == ["a:host", "b:host"]
+
+    laze.server.refresh_cache("build")
+    assert generate.configure_cache is not preloaded
@@ -0,0 +1,50 @@
+import os
+
+import laze.slots
+
+
+def test_restore(project_dir):
+    project_dir.write_project()
+    project_dir.generate(write=True)
+    ninja = project_dir.read("build/build.ninja")
+    stats = project_dir.read("build/laze-stats.json")
+    laze.slots.save_slot("build", "one", 2)
+
+    project_dir.write({"build/build.ninja": "other", "build/laze-stats.json": ""})
+    assert laze.slots.restore_slot("build", "one")
+    assert project_dir.read("build/build.ninja") == ninja
+    assert project_dir.read("build/laze-stats.json") == stats
+
+    assert not laze.slots.restore_slot("build", "two")
+
+
+def test_restore_changed_buildfiles(project_dir):
+    files = project_dir.write_project()
+    project_dir.generate(write=True)
+    laze.slots.save_slot("build", "one", 2)
+
+    project_dir.write({"app/laze.yml": files["app/laze.yml"] + "\n"})
+    assert not laze.slots.restore_slot("build", "one")
+
+
+def test_evict(project_dir):
+    project_dir.write_project()
+    project_dir.generate(write=True)
+
+    for n, digest in enumerate(["one", "two"]):
+        laze.slots.save_slot("build", digest, 2)
+        path = laze.slots.slot_dir("build", digest)
+        os.utime(path, ns=(n * 10 ** 9, n * 10 ** 9))
+
+    # "one" was used last, "two" is evicted
+    assert laze.slots.restore_slot("build", "one")
+    laze.slots.save_slot("build", "three", 2)
+
+    assert sorted(os.listdir(project_dir.path("build/variants"))) == ["one", "three"]
+
+def test_disabled(project_dir):
+    project_dir.write_project()
+    project_dir.generate(write=True)
+    laze.slots.save_slot("build", "one", 0)
+
+    assert not os.path.exists(project_dir.path("build/variants"))
@@ -0,0 +1,71 @@
+from conftest import APP, MODULE, builds, outputs
+
+# "opt" enables an optional source of "m"
+ROOT = """
+    module:
+        - name: opt
+    """
+
+APP_OPT = APP + """
+              - opt
+    """
+
+MODULE_UNITY = MODULE + """
+              - m3.c
+              - s.S
+              - special.c
+              - opt: o.c
+          unity: %s
+    """
+
+
+def generate(project_dir, unity="true"):
+    project_dir.write_project(root=ROOT, app=APP_OPT, module=MODULE_UNITY % unity)
+    return project_dir.generate()
+
+
+def cc_inputs(graph):
+    return sorted(source for build in builds(graph, "CC") for source in build["inputs"])
+
+
+def test_unity(project_dir):
+    project, graph = generate(project_dir)
+
+    # one amalgamation per module and extension, named after the module.
+    # single sources and optional sources are built separately.
+    assert project.generated_files == {"build/unity/m/m_0.c"}
+    assert cc_inputs(graph) == ["app/main.c", "build/unity/m/m_0.c", "m/o.c"]
+    assert [build["inputs"] for build in builds(graph, "ASM")] == [["m/s.S"]]
+
+
+def test_unity_content(project_dir):
+    generate(project_dir)
+    project_dir.generate(write=True)
+
+    assert project_dir.read("build/unity/m/m_0.c") == (
+        '#include "../../../m/m1.c"\n'
+        '#include "../../../m/m2.c"\n'
+        '#include "../../../m/m3.c"\n'
+        '#include "../../../m/special.c"\n'
+    )
+
+
+def test_unity_chunks(project_dir):
+    project, graph = generate(project_dir, "{chunk: 2, exclude: [special.c]}")
+
+    assert project.generated_files == {"build/unity/m/m_0.c"}
+    assert cc_inputs(graph) == [
+        "app/main.c",
+        "build/unity/m/m_0.c",
+        "m/m3.c",
+        "m/o.c",
+        "m/special.c",
+    ]
+
+
+def test_unity_disabled(project_dir):
+    project, graph = generate(project_dir, "false")
+
+    assert not project.generated_files
+    assert "build/unity/m/m_0.o" not in outputs(graph)
+    assert len(cc_inputs(graph)) == 6
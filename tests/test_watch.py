@@ -0,0 +1,50 @@
+import os
+
+from conftest import APP
+from laze.watch import get_watch_set, is_relevant
+
+
+def write_project(project_dir):
+    # apps in a nested folder
+    project_dir.write_project(
+        subdirs=("apps/a", "m"), app=None, files={"apps/a/laze.yml": APP}
+    )
+
+
+def test_watch_set(project_dir):
+    write_project(project_dir)
+    project_dir.generate(write=True)
+
+    files, folders = get_watch_set("build/laze-files.mp", "build")
+
+    # the default import is below the build dir
+    assert files == {"laze-project.yml", "apps/a/laze.yml", "m/laze.yml"}
+    assert folders == {".", "apps", "apps/a", "m"}
+
+
+def test_watch_set_absolute_paths(project_dir):
+    write_project(project_dir)
+    project_dir.generate(write=True)
+
+    files, folders = get_watch_set(
+        "build/laze-files.mp", os.path.abspath("build")
+    )
+    assert files == {"laze-project.yml", "apps/a/laze.yml", "m/laze.yml"}
+
+
+def test_watch_set_no_log(project_dir):
+    assert get_watch_set("build/laze-files.mp", "build") == (set(), set())
+
+
+def test_relevant(project_dir):
+    write_project(project_dir)
+    project_dir.generate(write=True)
+    files, folders = get_watch_set("build/laze-files.mp", "build")
+
+    assert is_relevant(files, folders, "apps/a", "laze.yml")
+    assert is_relevant(files, folders, "apps/b", "laze-project.yml")
+    # re-created subdir
+    assert is_relevant(files, folders, ".", "apps")
+    assert is_relevant(files, folders, "apps", "a")
+    assert not is_relevant(files, folders, "apps/a", "a.c")
+    assert not is_relevant(files, folders, ".", "bin")